@@ -0,0 +1,248 @@
+"""
+Column Profiling
+
+Profiles every column of a table in a single streaming scan: null counts,
+min, max and mean, an approximate distinct count (HyperLogLog) and
+approximate top-k values (count-min sketch plus a small candidate set),
+optionally with a uniform reservoir sample of rows. Memory is bounded by
+the sketch sizes and the batch size, not the table.
+
+Rows are processed a batch at a time, column by column: each batch is
+first reduced to a Counter of its values, so the sketches see every
+distinct value of a batch once instead of once per row, and nulls, min
+and max come from C builtins.
+"""
+
+import math
+import random
+from array import array
+from collections import Counter
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hashes(values) -> list:
+    """64-bit hashes with well-mixed bits; Python's own hash of small ints is the int itself."""
+    # MurmurHash3 fmix64 finalizer, a stage at a time over the whole list
+    hs = [hash(v) & _MASK64 for v in values]
+    hs = [((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & _MASK64 for h in hs]
+    hs = [((h ^ (h >> 33)) * 0xC4CEB9FE1A85EC53) & _MASK64 for h in hs]
+    return [h ^ (h >> 33) for h in hs]
+
+
+class HyperLogLog:
+    """Approximate distinct counter; standard error about 1.04 / sqrt(2 ** precision)."""
+
+    def __init__(self, precision: int = 14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add_hashes(self, hashes):
+        registers, p, mask, width = self.registers, self.p, self.m - 1, 64 - self.p
+        for h in hashes:
+            index = h & mask
+            rank = width - (h >> p).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / math.fsum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class CountMinSketch:
+    """Approximate frequencies that never undercount; overcount is at most total * e / width w.h.p."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.tables = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    @property
+    def error(self) -> float:
+        """Overcount bound: estimates within this of each other are indistinguishable."""
+        return math.e * self.total / self.width
+
+    def _cells(self, hashes: list, row: int) -> list:
+        mask = self.width - 1
+        return [((h & 0xFFFFFFFF) + row * (h >> 32)) & mask for h in hashes]
+
+    def add_hashes(self, hashes: list, counts: list) -> list:
+        """Add counts[i] for the value hashed to hashes[i]; returns their new estimates."""
+        self.total += sum(counts)
+        rows = []
+        # One table at a time, so the inner loops stay in comprehensions
+        for row, table in enumerate(self.tables):
+            cells = self._cells(hashes, row)
+            for cell, n in zip(cells, counts):
+                table[cell] += n
+            rows.append([table[cell] for cell in cells])
+        return list(map(min, *rows))
+
+    def estimate(self, h: int) -> int:
+        return min(self.tables[row][self._cells([h], row)[0]] for row in range(self.depth))
+
+
+class ColumnProfile:
+    def __init__(self, name: str, top_k: int):
+        self.name = name
+        self.top_k = top_k
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.numeric = 0
+        self.total = 0.0
+        self.types = Counter()
+        self.distinct = HyperLogLog()
+        self.frequencies = CountMinSketch()
+        self.candidates = {}
+        self._threshold = 0
+
+    def add(self, values):
+        self.count += len(values)
+        counts = Counter(values)
+        nulls = counts.pop(None, 0)
+        self.nulls += nulls
+        if not counts:
+            return
+        kinds = Counter(map(type, values))
+        kinds.pop(type(None), None)
+        for kind, n in kinds.items():
+            self.types[kind.__name__] += n
+        present = list(counts)
+        self._extremes(present, kinds)
+        if kinds.keys() <= {int, float}:
+            self.numeric += len(values) - nulls
+            self.total += math.fsum(v * c for v, c in counts.items())
+        elif int in kinds or float in kinds:
+            numbers = [(v, c) for v, c in counts.items() if type(v) in (int, float)]
+            self.numeric += sum(c for _, c in numbers)
+            self.total += math.fsum(v * c for v, c in numbers)
+
+        hashes = _hashes(present)
+        self.distinct.add_hashes(hashes)
+        estimates = self.frequencies.add_hashes(hashes, list(counts.values()))
+        candidates, threshold = self.candidates, self._threshold
+        if len(candidates) < 4 * self.top_k:
+            threshold = -1
+        for value, estimate in zip(present, estimates):
+            if estimate > threshold or value in candidates:
+                candidates[value] = estimate
+        if len(candidates) > 8 * self.top_k:
+            # Keep the heaviest few; anything dropped must outgrow the new threshold to return
+            kept = sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:4 * self.top_k]
+            self.candidates = dict(kept)
+            self._threshold = kept[-1][1]
+
+    def _extremes(self, present: list, kinds: Counter):
+        if len(kinds) > 1 and not kinds.keys() <= {int, float}:
+            # SQLite orders numbers < text < blob; Python cannot compare across those types
+            present = [(_TYPE_ORDER.get(type(v), 3), v) for v in present]
+            low, high = min(present)[1], max(present)[1]
+        else:
+            low, high = min(present), max(present)
+        if self.min is None or _sort_key(low) < _sort_key(self.min):
+            self.min = low
+        if self.max is None or _sort_key(high) > _sort_key(self.max):
+            self.max = high
+
+    def result(self) -> dict:
+        # Below the sketch's error bound a count may be all collisions (every
+        # value of a unique column would tie), so such values are not reported
+        values = list(self.candidates)
+        estimates = map(self.frequencies.estimate, _hashes(values))
+        noise = self.frequencies.error
+        top = sorted(
+            ((value, c) for value, c in zip(values, estimates) if c > noise),
+            key=lambda item: item[1], reverse=True,
+        )[:self.top_k]
+        present = self.count - self.nulls
+        return {
+            "name": self.name,
+            "nulls": self.nulls,
+            "nullFraction": round(self.nulls / self.count, 4) if self.count else 0.0,
+            "types": dict(self.types),
+            "min": jsonable(self.min),
+            "max": jsonable(self.max),
+            "mean": self.total / self.numeric if self.numeric else None,
+            "distinct": min(self.distinct.count(), present),
+            "top": [[jsonable(v), c] for v, c in top],
+        }
+
+
+_TYPE_ORDER = {int: 0, float: 0, str: 1, bytes: 2}
+
+
+def _sort_key(value):
+    return _TYPE_ORDER.get(type(value), 3), value
+
+
+def jsonable(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        return "x'" + data[:32].hex() + ("...'" if len(data) > 32 else "'")
+    return value
+
+
+class Reservoir:
+    """Uniform sample of k rows from a stream of unknown length (Algorithm L)."""
+
+    def __init__(self, k: int, seed: int | None = None):
+        self.k = k
+        self.rows = []
+        self.seen = 0
+        self.random = random.Random(seed)
+        self._w = math.exp(math.log(self.random.random()) / k) if k else 0.0
+        self._next = k + self._skip() if k else 0
+
+    def add(self, batch):
+        if not self.k:
+            return
+        start = self.seen
+        self.seen += len(batch)
+        if len(self.rows) < self.k:
+            take = self.k - len(self.rows)
+            self.rows.extend(batch[:take])
+        # Jump straight to the next row that replaces a sample slot
+        while self._next < self.seen:
+            self.rows[self.random.randrange(self.k)] = batch[self._next - start]
+            self._w *= math.exp(math.log(self.random.random()) / self.k)
+            self._next += self._skip() + 1
+
+    def _skip(self) -> int:
+        """Rows to pass over before the next replacement."""
+        return math.floor(math.log(self.random.random()) / math.log(1 - self._w))
+
+
+def profile_result(result, batch_rows: int = 10000, top_k: int = 5, sample: int = 0, budget=None) -> dict:
+    """Profile every column of an open SQLAlchemy result in one pass."""
+    names = list(result.keys())
+    columns = [ColumnProfile(name, top_k) for name in names]
+    reservoir = Reservoir(sample)
+    rows = 0
+    while True:
+        batch = result.fetchmany(batch_rows)
+        if not batch:
+            break
+        rows += len(batch)
+        if budget is not None:
+            budget.rows = rows
+        for column, values in zip(columns, zip(*batch)):
+            column.add(values)
+        reservoir.add(batch)
+    out = {"rows": rows, "columns": [c.result() for c in columns]}
+    if sample:
+        out["sample"] = {"columns": names, "rows": [[jsonable(v) for v in row] for row in reservoir.rows]}
+    return out
+
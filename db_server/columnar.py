@@ -0,0 +1,201 @@
+"""
+Columnar Result Encoding
+
+Opt-in alternative to row-major JSON for db_query and db_preview. Each
+column is sent once with a type: integers as packed little-endian arrays
+of the narrowest width that holds them (int8 to int64), floats as packed
+float64, repeated strings as a dictionary plus packed indices, everything
+else as a plain list. Nulls live in a validity
+bitmap (bit set = value present, least significant bit first, as in
+Arrow) and their slots in packed arrays hold zero. Binary payloads are
+base64 so the result stays JSON; in mixed columns dates and times are ISO
+8601 and other values (Decimal, UUID) their str().
+
+The same columns can also be written as Arrow IPC stream or Parquet bytes
+when pyarrow is installed; it is optional and only imported on demand.
+"""
+
+import base64
+import datetime
+import io
+import sys
+from array import array
+from itertools import repeat
+from operator import is_not
+
+FORMATS = ("rows", "columnar", "arrow", "parquet")
+
+# Dictionary-encode a string column once it has at most this share of distinct values
+DICTIONARY_MAX_RATIO = 0.5
+
+_INDEX_TYPES = (("B", "uint8"), ("H", "uint16"), ("I", "uint32"))
+_INT_TYPES = (("b", "int8", 8), ("h", "int16", 16), ("i", "int32", 32), ("q", "int64", 64))
+
+
+class EncodingUnavailable(Exception):
+    """Raised when a format needs an optional dependency that is not installed."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _text(value) -> str:
+    """String form of a value that is not int, float or str, for mixed columns."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _b64(bytes(value))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _packed(typecode: str, values) -> str:
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return _b64(packed.tobytes())
+
+
+def _validity(values) -> str | None:
+    """Validity bitmap for values, or None when nothing is null."""
+    if None not in values:
+        return None
+    flags = bytes(map(is_not, values, repeat(None)))
+    flags += bytes(-len(flags) % 8)
+    # Byte i of flags[k::8] is the flag of value 8i + k; shifting it by k puts it on bit k of bitmap byte i
+    bitmap = 0
+    for k in range(8):
+        bitmap |= int.from_bytes(flags[k::8], "little") << k
+    return _b64(bitmap.to_bytes(len(flags) // 8, "little"))
+
+
+def column_type(values) -> str:
+    """int64, float64, string, binary or mixed, judged from the non-null values (SQLite typing is per value)."""
+    kinds = set(map(type, values))
+    kinds.discard(type(None))
+    if not kinds or kinds == {int}:
+        return "int64"
+    if kinds <= {int, float}:
+        return "float64"
+    if kinds == {str}:
+        return "string"
+    if kinds <= {bytes, bytearray, memoryview}:
+        return "binary"
+    return "mixed"
+
+
+def _int_typecode(values) -> tuple[str, str]:
+    """Narrowest signed width holding every value, as (array typecode, type name)."""
+    present = [v for v in values if v is not None] if None in values else values
+    low, high = (min(present), max(present)) if present else (0, 0)
+    for typecode, name, bits in _INT_TYPES:
+        if -(1 << (bits - 1)) <= low and high < (1 << (bits - 1)):
+            return typecode, name
+    return "q", "int64"
+
+
+def _filled(values, fill) -> list:
+    return [fill if v is None else v for v in values] if None in values else values
+
+
+def _encode_column(name: str, values) -> dict:
+    type_ = column_type(values)
+    column = {"name": name, "type": type_, "nulls": _validity(values)}
+    if type_ == "int64":
+        typecode, column["type"] = _int_typecode(values)
+        column["data"] = _packed(typecode, _filled(values, 0))
+    elif type_ == "float64":
+        column["data"] = _packed("d", _filled(values, 0.0))
+    elif type_ == "string":
+        dictionary = dict.fromkeys(values)
+        dictionary.pop(None, None)
+        if len(dictionary) <= DICTIONARY_MAX_RATIO * len(values):
+            typecode, index_type = _INDEX_TYPES[(len(dictionary) > 0xFF) + (len(dictionary) > 0xFFFF)]
+            index = {v: i for i, v in enumerate(dictionary)}
+            index[None] = 0
+            column["dictionary"] = list(dictionary)
+            column["indexType"] = index_type
+            column["indices"] = _packed(typecode, map(index.__getitem__, values))
+        else:
+            column["data"] = list(values)
+    elif type_ == "binary":
+        column["data"] = [None if v is None else _b64(bytes(v)) for v in values]
+    else:
+        column["data"] = [v if v is None or isinstance(v, (int, float, str)) else _text(v) for v in values]
+    return column
+
+
+def _columns(names: list, rows: list) -> list:
+    """Transpose rows (tuples or Row objects) into one tuple per column."""
+    if not rows:
+        return [() for _ in names]
+    return list(zip(*rows))
+
+
+def encode_columnar(names: list, rows: list) -> dict:
+    return {
+        "format": "columnar",
+        "rowCount": len(rows),
+        "columns": [_encode_column(n, v) for n, v in zip(names, _columns(names, rows))],
+    }
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise EncodingUnavailable("arrow and parquet output need pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def require_encoder(fmt: str) -> None:
+    """Raise EncodingUnavailable now if fmt cannot be encoded, before a query runs for it."""
+    if fmt in ("arrow", "parquet"):
+        _pyarrow()
+
+
+def arrow_table(names: list, rows: list, dictionary: bool = True):
+    """pyarrow Table of the rows, typed as in the columnar encoding."""
+    pa = _pyarrow()
+    arrays = []
+    for values in _columns(names, rows):
+        type_ = column_type(values)
+        if type_ == "int64":
+            arrays.append(pa.array(values, pa.int64()))
+        elif type_ == "float64":
+            arrays.append(pa.array([None if v is None else float(v) for v in values], pa.float64()))
+        elif type_ == "string":
+            array_ = pa.array(values, pa.string())
+            if dictionary and len(set(values)) <= DICTIONARY_MAX_RATIO * len(values):
+                array_ = array_.dictionary_encode()
+            arrays.append(array_)
+        elif type_ == "binary":
+            arrays.append(pa.array([None if v is None else bytes(v) for v in values], pa.binary()))
+        else:
+            arrays.append(pa.array([v if v is None or isinstance(v, str) else _text(v) for v in values], pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(n) for n in names])
+
+
+def encode_binary(names: list, rows: list, fmt: str) -> dict:
+    """Arrow IPC stream or Parquet file bytes, base64 encoded."""
+    table = arrow_table(names, rows)
+    buffer = io.BytesIO()
+    if fmt == "arrow":
+        import pyarrow as pa
+        with pa.ipc.new_stream(buffer, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, buffer)
+    return {"format": fmt, "rowCount": len(rows), "data": _b64(buffer.getvalue())}
+
+
+def encode_result(names: list, rows: list, fmt: str = "rows") -> dict:
+    """Result body in the requested format; rows is the familiar row-major JSON."""
+    if fmt == "rows":
+        return {"columns": list(names), "rows": [list(r) for r in rows], "rowCount": len(rows)}
+    if fmt == "columnar":
+        return encode_columnar(names, rows)
+    if fmt in ("arrow", "parquet"):
+        return encode_binary(names, rows, fmt)
+    raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
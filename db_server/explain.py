@@ -0,0 +1,257 @@
+"""
+Query Plan Analysis
+
+Runs EXPLAIN QUERY PLAN for a statement (nothing is executed), renders the
+plan tree the way the sqlite3 shell does and annotates each loop with a
+row estimate: table sizes come from the schema cache, index selectivity
+from sqlite_stat1 where ANALYZE has run and from SQLite's own defaults
+(about 10 rows per key, a quarter of the table per range bound) where it
+has not. Loops nested under the same parent multiply, which gives a rough
+estimated cost in rows visited.
+
+Full scans of large tables are flagged and, from the columns the SQL
+filters, joins and sorts on, a (covering) index is suggested. The advice
+comes from pattern matching on the SQL text, not a parser, so it is a
+starting point to check with db_explain again, not a guarantee.
+"""
+
+import re
+
+_LOOP = re.compile(
+    r"^(?P<op>SCAN|SEARCH) (?P<name>\S+)(?: AS \S+)?"
+    r"(?: USING (?P<how>AUTOMATIC (?:PARTIAL )?COVERING INDEX|COVERING INDEX|INDEX|INTEGER PRIMARY KEY|PRIMARY KEY)"
+    r"(?: (?P<index>[^ (]+))?)?(?: \((?P<cond>.*)\))?$"
+)
+_SOURCE = re.compile(
+    r"\b(?:from|join)\s+[\"`\[]?(\w+)[\"`\]]?(?:\s+(?:as\s+)?[\"`\[]?(\w+)[\"`\]]?)?"
+    r"|,\s*[\"`\[]?(\w+)[\"`\]]?(?:\s+(?:as\s+)?[\"`\[]?(\w+)[\"`\]]?)?",
+    re.IGNORECASE,
+)
+_NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on", "using", "group",
+    "order", "limit", "union", "except", "intersect", "having", "window", "as", "set", "values", "indexed", "not",
+}
+# String literals and bound parameters (?, ?1, :name, @name, $name), which must not pass for column names
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\?\d*|[:@$]\w+")
+_EQUALITY = r"(?:==?|\bIN\b|\bIS\b)"
+_RANGE = r"(?:<=?|>=?|\bBETWEEN\b|\bLIKE\b|\bGLOB\b)"
+
+DEFAULT_ROWS_PER_KEY = 10
+
+
+def run_plan(dbapi_connection, sql: str, params: dict | None) -> list:
+    """(id, parent, detail) rows of EXPLAIN QUERY PLAN; unbound parameters plan as NULL."""
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, _Bindings(params or {})).fetchall()
+    finally:
+        cursor.close()
+    return [(node_id, parent, detail) for node_id, parent, _, detail in rows]
+
+
+class _Bindings(dict):
+    def __missing__(self, key):
+        return None
+
+
+def index_stats(dbapi_connection) -> dict:
+    """{index or table name: [rows, rows per key prefix...]} from sqlite_stat1, empty before ANALYZE."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone() is None:
+            return {}
+        stats = {}
+        for table, index, stat in cursor.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+            numbers = [int(n) for n in (stat or "").split() if n.isdigit()]
+            if numbers:
+                stats[index or table] = numbers
+        return stats
+    finally:
+        cursor.close()
+
+
+def _sources(sql: str, tables: dict) -> dict:
+    """{alias or table name (lower case): table} for the tables named in FROM/JOIN clauses."""
+    by_lower = {t.lower(): t for t in tables}
+    sources = dict(by_lower)
+    for m in _SOURCE.finditer(sql):
+        name, alias = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        table = by_lower.get(name.lower())
+        if table and alias and alias.lower() not in _NOT_ALIASES:
+            sources[alias.lower()] = table
+    return sources
+
+
+def _index(info: dict | None, name: str | None) -> dict | None:
+    return next((ix for ix in info["indexes"] if ix["name"] == name), None) if info and name else None
+
+
+def _estimate(loop: dict, info: dict | None, stats: dict) -> int | None:
+    """Rows one execution of a SCAN/SEARCH loop visits."""
+    total = info["rows"]["estimate"] if info and info.get("rows") else None
+    if total is None and loop["table"] in stats:
+        total = stats[loop["table"]][0]
+    if total is None:
+        return None
+    if loop["op"] == "SCAN":
+        return total
+    cond = loop["cond"] or ""
+    equalities = len(re.findall(r"(?<![<>!])=\?", cond))
+    ranges = len(re.findall(r"[<>]=?\?", cond))
+    if not equalities:
+        rows = total
+    elif loop["how"] == "INTEGER PRIMARY KEY":
+        rows = 1
+    else:
+        index = _index(info, loop["index"])
+        index_stat = stats.get(loop["index"] or "")
+        if index_stat and len(index_stat) > equalities:
+            rows = index_stat[equalities]
+        elif index and index["unique"] and equalities >= len(index["columns"].split(", ")):
+            rows = 1
+        else:
+            rows = DEFAULT_ROWS_PER_KEY
+    for _ in range(ranges):
+        rows //= 4
+    return max(1, min(rows, total))
+
+
+def _columns_used(sql: str, table: str, alias: str, columns: list, single_table: bool) -> dict:
+    """Columns of one table the SQL refers to, split into equality, range and ordering use."""
+    qualifier = r"(?:\b%s\.|\b%s\.)" % (re.escape(alias), re.escape(table))
+    if single_table:
+        # Bare names count too, unless qualified by something else
+        qualifier = r"(?:%s|(?<![.\w]))" % qualifier
+    used = {"eq": [], "range": [], "order": [], "all": []}
+    order_by = re.search(r"\b(?:order|group)\s+by\b(?P<rest>.*?)(?:\blimit\b|$)", sql, re.IGNORECASE | re.DOTALL)
+    for column in columns:
+        ref = qualifier + r'"?%s"?\b' % re.escape(column)
+        if not re.search(ref, sql, re.IGNORECASE):
+            continue
+        used["all"].append(column)
+        if re.search(ref + r"\s*" + _EQUALITY, sql, re.IGNORECASE) or re.search(r"(?<![<>!])==?\s*" + ref, sql, re.IGNORECASE):
+            used["eq"].append(column)
+        elif re.search(ref + r"\s*" + _RANGE, sql, re.IGNORECASE) or re.search(r"[<>]=?\s*" + ref, sql, re.IGNORECASE):
+            used["range"].append(column)
+        if order_by and re.search(ref, order_by.group("rest"), re.IGNORECASE):
+            used["order"].append(column)
+    return used
+
+
+def _advise(sql: str, loop: dict, info: dict, single_table: bool, has_stats: bool, filters_only: bool = False) -> str | None:
+    """Index suggestion for the table of a loop; filters_only keeps just its equality columns."""
+    table, alias = loop["table"], loop["name"]
+    # The INTEGER PRIMARY KEY is the rowid itself; indexing it again never helps
+    rowid_alias = [c["name"] for c in info["columns"] if c["pk"] and c["type"].upper() == "INTEGER"] if info.get("rowid") else []
+    columns = [c["name"] for c in info["columns"] if c["name"] not in rowid_alias]
+    used = _columns_used(sql, table, alias, columns, single_table)
+    key = used["eq"] + used["range"][:1]
+    if filters_only:
+        key = used["eq"]
+        if not key:
+            return None
+    elif not used["range"]:
+        key += [c for c in used["order"] if c not in key]
+    star = re.search(r"\bselect\s+(?:distinct\s+)?\*|\b%s\.\*" % re.escape(alias), sql, re.IGNORECASE)
+    rest = [c for c in used["all"] if c not in key]
+    covering = not star and len(key) + len(rest) <= 6
+    columns = key + (rest if covering else [])
+    if not columns:
+        return None
+    for index in info["indexes"]:
+        leading = index["columns"].split(", ")[:len(key)]
+        if key and leading == key:
+            if not has_stats:
+                return f"index {index['name']} already leads with ({', '.join(key)}); run ANALYZE so the planner can cost it"
+            if not covering:
+                return None
+    name = "idx_" + "_".join([table] + columns)
+    kind = "covering index" if covering and rest else "index"
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    return f'{kind} for {table}: CREATE INDEX "{name}" ON "{table}" ({quoted})'
+
+
+def analyze(dbapi_connection, sql: str, params: dict | None, tables: dict, large_table_rows: int) -> dict:
+    """Plan tree, per-loop row estimates, estimated cost, full-scan warnings and index suggestions."""
+    plan = run_plan(dbapi_connection, sql, params)
+    stats = index_stats(dbapi_connection)
+    # Only the text is matched from here on; literals become placeholders so their contents are not read as SQL
+    sql = _LITERAL.sub("?", sql)
+    sources = _sources(sql, tables)
+    single_table = len({t for t in sources.values() if re.search(r"\b%s\b" % re.escape(t), sql, re.IGNORECASE)}) <= 1
+
+    nodes, children = {}, {}
+    for node_id, parent, detail in plan:
+        node = {"id": node_id, "parent": parent, "detail": detail}
+        m = _LOOP.match(detail)
+        if m and m.group("name").lower() in sources:
+            node.update(m.groupdict())
+            node["table"] = sources[m.group("name").lower()]
+            node["rows"] = _estimate(node, tables.get(node["table"]), stats)
+        nodes[node_id] = node
+        children.setdefault(parent, []).append(node_id)
+
+    warnings, suggestions = [], []
+    if not stats:
+        warnings.append("no sqlite_stat1 statistics; estimates use table sizes and SQLite defaults (run ANALYZE)")
+    for node in nodes.values():
+        if "table" not in node:
+            if "AUTOMATIC" in node["detail"] or node["detail"].startswith("USE TEMP B-TREE"):
+                warnings.append(node["detail"].lower())
+            continue
+        info = tables.get(node["table"])
+        if node["how"] and node["how"].startswith("AUTOMATIC"):
+            warnings.append(f"SQLite builds a temporary index on {node['table']} for every run")
+        elif node["op"] == "SCAN" and node["rows"] is not None and node["rows"] >= large_table_rows:
+            what = "full index scan" if node["how"] else "full table scan"
+            node["flag"] = what.upper()
+            warnings.append(f"{what} of {node['table']} (~{node['rows']:,} rows)")
+        else:
+            continue
+        advice = _advise(sql, node, info, single_table, bool(stats)) if info else None
+        if advice and advice not in suggestions:
+            suggestions.append(advice)
+        # A filtered table elsewhere in the join could drive it instead of the scan
+        for other_id in children.get(node["parent"], []):
+            other = nodes[other_id]
+            if other_id != node["id"] and "table" in other and other["table"] in tables:
+                advice = _advise(sql, other, tables[other["table"]], single_table, bool(stats), filters_only=True)
+                if advice and advice not in suggestions:
+                    suggestions.append(advice)
+
+    def chain_cost(parent: int) -> int:
+        # Sibling loops nest in order: each runs once per row produced by the loops before it
+        cost, outer = 0, 1
+        for node_id in children.get(parent, []):
+            node = nodes[node_id]
+            if node.get("rows") is not None:
+                outer *= node["rows"]
+                cost += outer
+            cost += chain_cost(node_id)
+        return cost
+
+    return {
+        "plan": render_plan(nodes, children),
+        "nodes": [{k: v for k, v in n.items() if v is not None} for n in nodes.values()],
+        "estimatedCost": chain_cost(0),
+        "warnings": warnings,
+        "suggestions": suggestions,
+    }
+
+
+def render_plan(nodes: dict, children: dict) -> str:
+    lines = ["QUERY PLAN"]
+
+    def walk(parent: int, prefix: str):
+        kids = children.get(parent, [])
+        for i, node_id in enumerate(kids):
+            node = nodes[node_id]
+            last = i == len(kids) - 1
+            note = ""
+            if node.get("rows") is not None:
+                note = f"  [~{node['rows']:,} rows" + (f", {node['flag']}]" if node.get("flag") else "]")
+            lines.append(prefix + ("`--" if last else "|--") + node["detail"] + note)
+            walk(node_id, prefix + ("   " if last else "|  "))
+
+    walk(0, "")
+    return "\n".join(lines)
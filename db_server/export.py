@@ -0,0 +1,181 @@
+"""
+Streaming Export
+
+Writes a query result to a local CSV, NDJSON or Parquet file without
+holding it in memory: the statement runs on a streaming cursor and rows
+are fetched and written in fixed-size batches, so memory stays flat
+whatever the result size and DB_MAX_ROWS does not apply. Output goes to
+a uniquely named ".part" file beside the target that is moved into place
+only once complete.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import nullcontext
+
+from sqlalchemy import text
+
+from columnar import EncodingUnavailable, arrow_table
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+
+# mkstemp creates files 0600; exports get the permissions open() would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+class ExportError(Exception):
+    """Raised for export requests that cannot be carried out."""
+
+
+def export_path(directory: str, name: str | None, fmt: str) -> str:
+    """Output path inside directory; name is reduced to a plain file name."""
+    if name:
+        base = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(name)).lstrip(".")
+    else:
+        base = time.strftime("export-%Y%m%d-%H%M%S")
+    if not base:
+        raise ExportError("invalid export file name")
+    if not base.endswith("." + fmt):
+        base += "." + fmt
+    return os.path.join(directory, base)
+
+
+class _CsvWriter:
+    def __init__(self, f, columns):
+        self.text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class _NdjsonWriter:
+    def __init__(self, f, columns):
+        self.f = f
+        self.columns = columns
+
+    def write(self, rows):
+        columns = self.columns
+        self.f.write("".join(
+            json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) + "\n" for row in rows
+        ).encode())
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, f, columns):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise EncodingUnavailable("parquet export needs pyarrow (pip install pyarrow)") from e
+        self.pq = pq
+        self.f = f
+        self.columns = columns
+        self.writer = None
+
+    def write(self, rows):
+        table = arrow_table(self.columns, rows, dictionary=False)
+        if self.writer is None:
+            # The first batch fixes the schema; Parquet dictionary-encodes columns itself
+            self.writer = self.pq.ParquetWriter(self.f, table.schema)
+        elif table.schema != self.writer.schema.to_arrow_schema():
+            try:
+                table = table.cast(self.writer.schema.to_arrow_schema())
+            except Exception as e:
+                raise ExportError(f"column types change between batches ({e}); CAST the columns in the query") from e
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "ndjson": _NdjsonWriter, "parquet": _ParquetWriter}
+
+
+def _exists(path: str) -> ExportError:
+    return ExportError(f"{os.path.basename(path)} already exists; choose another filename or pass overwrite")
+
+
+def export_query(engine, sql: str, params: dict | None, path: str, fmt: str, batch_rows: int,
+                 progress=None, budget=None, overwrite: bool = False) -> dict:
+    """Stream the result of sql to path in batches of batch_rows; progress(rows, bytes) runs after each batch.
+
+    budget is an optional QueryBudget limiting (or cancelling) the statement.
+    An existing file at path is only replaced when overwrite is set.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    # Checked up front so a long export is not run only to be thrown away
+    if not overwrite and os.path.exists(path):
+        raise _exists(path)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Unique per export, so concurrent exports to the same name never share a partial file
+    fd, partial = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".part")
+    started = time.perf_counter()
+    rows_written = 0
+    try:
+        with os.fdopen(fd, "wb") as f, engine.connect() as c, \
+                (budget.watch(c.connection.dbapi_connection) if budget is not None else nullcontext()):
+            os.fchmod(f.fileno(), FILE_MODE)
+            result = c.execute(text(sql).execution_options(stream_results=True), params or {})
+            if not result.returns_rows:
+                raise ExportError("statement returns no rows")
+            columns = list(result.keys())
+            writer = _WRITERS[fmt](f, columns)
+            while True:
+                batch = result.fetchmany(batch_rows)
+                if not batch:
+                    break
+                writer.write(batch)
+                rows_written += len(batch)
+                if budget is not None:
+                    budget.rows = rows_written
+                if progress is not None:
+                    progress(rows_written, f.tell())
+            writer.close()
+            if fmt == "parquet" and writer.writer is None:
+                # No rows: still leave a valid, empty file with the column names
+                writer.write([])
+                writer.close()
+        if overwrite:
+            os.replace(partial, path)
+        else:
+            # A link fails rather than replace a file created while the export ran
+            try:
+                os.link(partial, path)
+            except FileExistsError:
+                raise _exists(path) from None
+            except OSError as e:
+                raise ExportError(
+                    f"cannot create {os.path.basename(path)} without overwriting: the export directory "
+                    f"does not support hard links ({e.strerror or e}); pass overwrite"
+                ) from e
+    finally:
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+    return {
+        "path": os.path.abspath(path),
+        "format": fmt,
+        "columns": columns,
+        "rowCount": rows_written,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
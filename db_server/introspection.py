@@ -0,0 +1,154 @@
+"""
+Schema Introspection
+
+Reads the whole SQLite schema in a handful of queries using the pragma
+table-valued functions (pragma_table_info, pragma_index_list,
+pragma_foreign_key_list) instead of one PRAGMA per table, and caches the
+result until PRAGMA schema_version changes.
+"""
+
+import threading
+
+_COLUMNS_SQL = """
+SELECT m.name, p.cid, p.name, p.type, p."notnull", p.dflt_value, p.pk
+FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+ORDER BY m.name, p.cid
+"""
+
+_INDEXES_SQL = """
+SELECT m.name, il.name, il."unique", il.origin, group_concat(ii.name, ', ')
+FROM sqlite_master AS m
+JOIN pragma_index_list(m.name) AS il
+JOIN pragma_index_info(il.name) AS ii
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+GROUP BY m.name, il.name
+ORDER BY m.name, il.name
+"""
+
+_FOREIGN_KEYS_SQL = """
+SELECT m.name, fk."from", fk."table", fk."to", fk.on_update, fk.on_delete
+FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS fk
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+ORDER BY m.name, fk.id, fk.seq
+"""
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA schema_version").scalar()
+
+
+def _rowid_tables(conn) -> set | None:
+    """Names of tables that have a rowid, or None when SQLite is too old to tell (pragma_table_list needs 3.37)."""
+    try:
+        return {name for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM pragma_table_list WHERE type = 'table' AND wr = 0"
+        )}
+    except Exception:
+        return None
+
+
+def _row_estimates(conn, tables: list[str], rowid_tables: set) -> dict:
+    """Row counts from sqlite_stat1 where ANALYZE has run, else max(rowid) (an upper bound, O(log n) per table)."""
+    estimates = {}
+    has_stat1 = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).first() is not None
+    if has_stat1:
+        for table, rows in conn.exec_driver_sql(
+            "SELECT tbl, max(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl"
+        ):
+            estimates[table] = (rows, "sqlite_stat1")
+
+    remaining = [t for t in tables if t not in estimates and t in rowid_tables]
+    # Chunked to stay under SQLite's compound SELECT limit (500 by default)
+    for start in range(0, len(remaining), 200):
+        chunk = remaining[start:start + 200]
+        sql = " UNION ALL ".join(f"SELECT ?, (SELECT max(rowid) FROM {_quote(t)})" for t in chunk)
+        for table, rows in conn.exec_driver_sql(sql, tuple(chunk)):
+            estimates[table] = (rows or 0, "max(rowid)")
+    return estimates
+
+
+def introspect(conn) -> dict:
+    """Tables with their columns, indexes, foreign keys, row estimates and whether they have a rowid."""
+    rowid_tables = _rowid_tables(conn)
+    tables = {}
+    for table, cid, name, type_, notnull, default, pk in conn.exec_driver_sql(_COLUMNS_SQL):
+        tables.setdefault(table, {
+            "columns": [], "indexes": [], "foreign_keys": [], "rows": None,
+            "rowid": None if rowid_tables is None else table in rowid_tables,
+        })
+        tables[table]["columns"].append({
+            "name": name, "type": type_, "notnull": bool(notnull), "default": default, "pk": pk,
+        })
+    for table, name, unique, origin, columns in conn.exec_driver_sql(_INDEXES_SQL):
+        if table in tables:
+            tables[table]["indexes"].append({
+                "name": name, "columns": columns, "unique": bool(unique), "origin": origin,
+            })
+    for table, column, ref_table, ref_column, on_update, on_delete in conn.exec_driver_sql(_FOREIGN_KEYS_SQL):
+        if table in tables:
+            tables[table]["foreign_keys"].append({
+                "column": column, "references": f"{ref_table}({ref_column or 'rowid'})",
+                "on_update": on_update, "on_delete": on_delete,
+            })
+    for table, (rows, source) in _row_estimates(conn, list(tables), rowid_tables or set()).items():
+        if table in tables:
+            tables[table]["rows"] = {"estimate": rows, "source": source}
+    return tables
+
+
+def render_markdown(tables: dict) -> str:
+    lines = ["| schema | table | column | type | pk | not null | default |", "|---|---|---|---|---|---|---|"]
+    for table, info in tables.items():
+        for col in info["columns"]:
+            default = "" if col["default"] is None else col["default"]
+            lines.append(
+                f"| main | {table} | {col['name']} | {col['type']} | {col['pk'] or ''} | "
+                f"{'yes' if col['notnull'] else ''} | {default} |"
+            )
+
+    lines += ["", "| table | index | columns | unique | origin |", "|---|---|---|---|---|"]
+    for table, info in tables.items():
+        for index in info["indexes"]:
+            lines.append(
+                f"| {table} | {index['name']} | {index['columns']} | {'yes' if index['unique'] else ''} | {index['origin']} |"
+            )
+
+    lines += ["", "| table | column | references | on update | on delete |", "|---|---|---|---|---|"]
+    for table, info in tables.items():
+        for fk in info["foreign_keys"]:
+            lines.append(f"| {table} | {fk['column']} | {fk['references']} | {fk['on_update']} | {fk['on_delete']} |")
+
+    lines += ["", "| table | rows (estimate) | source |", "|---|---|---|"]
+    for table, info in tables.items():
+        rows = info["rows"]
+        lines.append(f"| {table} | {rows['estimate'] if rows else '?'} | {rows['source'] if rows else ''} |")
+    return "\n".join(lines)
+
+
+class SchemaCache:
+    """Introspected schema and its Markdown, reused until schema_version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._tables = {}
+        self._markdown = ""
+        self.refreshes = 0
+
+    def get(self, conn) -> tuple[dict, str]:
+        """(tables, markdown) for the connection's database, re-read only after a schema change."""
+        version = schema_version(conn)
+        with self._lock:
+            if version != self._version:
+                self._tables = introspect(conn)
+                self._markdown = render_markdown(self._tables)
+                self._version = version
+                self.refreshes += 1
+            return self._tables, self._markdown
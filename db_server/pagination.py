@@ -0,0 +1,187 @@
+"""
+Result Pagination
+
+Continuation tokens for db_query and db_preview. Table previews page by key
+(rowid, or the primary key of WITHOUT ROWID tables): the token carries the
+last key seen and the next page is an index seek past it. Arbitrary queries
+cannot be resumed by key, so their cursor is held open server-side and the
+token names it (honoured only for the same SQL and parameters); held
+cursors are closed after an idle timeout or when too many are open.
+Either way a full walk costs linear time and each page holds
+at most one page of rows in memory.
+"""
+
+import base64
+import hashlib
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class InvalidCursor(Exception):
+    """Raised for malformed, expired or mismatched continuation tokens."""
+
+
+def encode_token(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("malformed cursor") from e
+    if not isinstance(state, dict):
+        raise InvalidCursor("malformed cursor")
+    return state
+
+
+def query_digest(sql: str, params: dict | None) -> str:
+    """Identity of a statement and its bound parameters, for matching a held cursor to its query."""
+    raw = json.dumps([sql, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def keyset_query(table: str, key_columns: list[str], after: list | None, limit: int) -> tuple[str, dict]:
+    """SELECT for the page of table after the given key, ordered by key; fetches limit + 1 rows to detect more."""
+    keys = ", ".join(quote_identifier(k) if k != "rowid" else "rowid" for k in key_columns)
+    sql = f"SELECT {keys}, * FROM {quote_identifier(table)}"
+    params = {"limit": limit + 1}
+    if after is not None:
+        placeholders = ", ".join(f":k{i}" for i in range(len(key_columns)))
+        # Row values compare lexicographically, matching ORDER BY over the same columns
+        sql += f" WHERE ({keys}) > ({placeholders})" if len(key_columns) > 1 else f" WHERE {keys} > :k0"
+        params.update({f"k{i}": value for i, value in enumerate(after)})
+    sql += f" ORDER BY {keys} LIMIT :limit"
+    return sql, params
+
+
+class _HeldCursor:
+    def __init__(self, conn, result, columns, pending, query):
+        self.conn = conn
+        self.result = result
+        self.columns = columns
+        self.pending = pending
+        self.query = query
+        self.used_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.result.close()
+            finally:
+                self.conn.close()
+
+
+class CursorRegistry:
+    """Server-side cursors kept open between db_query calls."""
+
+    def __init__(self, idle_timeout: float, max_open: int, budget=None):
+        self.idle_timeout = idle_timeout
+        # budget() returns a QueryBudget for each fetch, so later pages are limited like the first
+        self.budget = budget
+        self.max_open = max(1, max_open)
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.opened = 0
+        self.expired = 0
+
+    def hold(self, conn, result, columns: list, pending, sql: str, params: dict | None) -> str:
+        """Keep conn/result open for later pages; pending is the row already fetched past the page."""
+        cursor_id = secrets.token_urlsafe(12)
+        evicted = []
+        with self._lock:
+            self._cursors[cursor_id] = _HeldCursor(conn, result, columns, pending, query_digest(sql, params))
+            self.opened += 1
+            while len(self._cursors) > self.max_open:
+                evicted.append(self._cursors.popitem(last=False)[1])
+            self._start_reaper()
+        for cursor in evicted:
+            self.expired += 1
+            cursor.close()
+        return encode_token({"c": cursor_id})
+
+    def fetch(self, token: str, sql: str, params: dict | None, n: int) -> tuple[list, list, str | None]:
+        """Next n rows of a held cursor as (columns, rows, next token)."""
+        n = max(1, n)
+        cursor_id = decode_token(token).get("c")
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+        if cursor is None:
+            raise InvalidCursor("cursor expired or unknown; run the query again")
+        if cursor.query != query_digest(sql, params):
+            raise InvalidCursor("cursor belongs to a different query or parameters")
+
+        with cursor.lock:
+            if cursor.closed:
+                raise InvalidCursor("cursor expired or unknown; run the query again")
+            error = None
+            try:
+                rows = [cursor.pending, *self._fetchmany(cursor, n)]
+            except Exception as e:
+                error = e
+            else:
+                if len(rows) > n:
+                    cursor.pending = rows.pop()
+                    cursor.used_at = time.monotonic()
+                    return cursor.columns, rows, token
+
+        # Exhausted, or interrupted/failed and so impossible to resume
+        self.close(token)
+        if error is not None:
+            raise error
+        return cursor.columns, rows, None
+
+    def _fetchmany(self, cursor: _HeldCursor, n: int) -> list:
+        if self.budget is None:
+            return cursor.result.fetchmany(n)
+        with self.budget().watch(cursor.conn.connection.dbapi_connection) as budget:
+            return budget.fetchmany(cursor.result, n)
+
+    def close(self, token: str) -> bool:
+        cursor_id = decode_token(token).get("c")
+        with self._lock:
+            cursor = self._cursors.pop(cursor_id, None)
+        if cursor is None:
+            return False
+        cursor.close()
+        return True
+
+    def reap(self):
+        """Close cursors idle for longer than the timeout; each one pins a read snapshot of the database."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [cid for cid, cursor in self._cursors.items() if cursor.used_at < cutoff and not cursor.lock.locked()]
+            stale = [self._cursors.pop(cid) for cid in idle]
+        for cursor in stale:
+            self.expired += 1
+            cursor.close()
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(max(1.0, self.idle_timeout / 2))
+                self.reap()
+
+        self._reaper = threading.Thread(target=loop, name="cursor-reaper", daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._cursors), "opened": self.opened, "expired": self.expired}
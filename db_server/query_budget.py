@@ -0,0 +1,112 @@
+"""
+Query Budgets
+
+Wall-clock and VM-step limits for statements, enforced through SQLite's
+progress handler: while a statement runs SQLite calls back every few
+thousand virtual machine instructions, and the callback aborts it once the
+deadline or step budget is exceeded, or once another thread has asked for
+cancellation. The statement then fails with SQLITE_INTERRUPT, which is
+turned into QueryInterrupted saying how far the query got.
+"""
+
+import threading
+import time
+
+# VM instructions between progress handler calls; small enough to react within
+# milliseconds, large enough that the Python callback costs next to nothing
+CHECK_INTERVAL = 10000
+
+SQLITE_INTERRUPT = 9
+
+
+class QueryInterrupted(Exception):
+    """Raised when a statement was stopped by its budget or cancelled."""
+
+    def __init__(self, message: str, reason: str, seconds: float, steps: int):
+        super().__init__(message)
+        self.reason = reason
+        self.seconds = seconds
+        self.steps = steps
+
+
+class QueryBudget:
+    """Time and step limits for the statements run inside `with budget.watch(dbapi_connection):`.
+
+    seconds or max_steps of 0 mean no limit of that kind; cancel() may be called from any thread.
+    """
+
+    def __init__(self, seconds: float = 0, max_steps: int = 0):
+        self.dbapi_connection = None
+        self.seconds = seconds
+        self.max_steps = max_steps
+        self.steps = 0
+        self.rows = 0
+        self.reason = None
+        self._cancelled = threading.Event()
+        self._started = None
+        self._deadline = None
+
+    def watch(self, dbapi_connection):
+        self.dbapi_connection = dbapi_connection
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def fetchmany(self, result, n: int) -> list:
+        """result.fetchmany(n), counted into rows as each row arrives so an interrupt can say how many came back."""
+        rows = []
+        while len(rows) < n:
+            row = result.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+            self.rows += 1
+        return rows
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started if self._started is not None else 0.0
+
+    def _check(self) -> int:
+        self.steps += CHECK_INTERVAL
+        if self._cancelled.is_set():
+            self.reason = "cancelled"
+        elif self._deadline is not None and time.monotonic() > self._deadline:
+            self.reason = "timeout"
+        elif self.max_steps and self.steps > self.max_steps:
+            self.reason = "steps"
+        return 1 if self.reason else 0
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        self._deadline = self._started + self.seconds if self.seconds else None
+        # Only sqlite3 connections have a progress handler; other drivers run unbudgeted
+        if hasattr(self.dbapi_connection, "set_progress_handler"):
+            self.dbapi_connection.set_progress_handler(self._check, CHECK_INTERVAL)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if hasattr(self.dbapi_connection, "set_progress_handler"):
+            self.dbapi_connection.set_progress_handler(None, 0)
+        if self.reason and exc is not None and _is_interrupt(exc):
+            raise self.interrupted() from exc
+        return False
+
+    def interrupted(self) -> QueryInterrupted:
+        limit = {
+            "timeout": f"the {self.seconds:g}s time limit",
+            "steps": f"the {self.max_steps:,} VM step limit",
+            "cancelled": "cancellation",
+        }[self.reason]
+        message = (
+            f"query stopped by {limit} after {self.elapsed:.2f}s, "
+            f"~{self.steps:,} VM steps and {self.rows:,} rows returned"
+        )
+        return QueryInterrupted(message, self.reason, self.elapsed, self.steps)
+
+
+def _is_interrupt(exc: BaseException) -> bool:
+    error = getattr(exc, "orig", exc)
+    code = getattr(error, "sqlite_errorcode", None)
+    return code == SQLITE_INTERRUPT or "interrupted" in str(error)
@@ -0,0 +1,133 @@
+"""
+Query Result Cache
+
+LRU cache of db_query/db_preview results keyed by normalized SQL, bound
+parameters and row cap, bounded by total (JSON-encoded) bytes. The whole
+cache is dropped as soon as the database changes, detected via PRAGMA
+data_version on a dedicated probe connection, opened outside the engine's
+pool so it never holds a pooled slot (it moves whenever any other
+connection commits) together with the mtime and size of the database and
+WAL files (which also catch the file being replaced).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from sqlite_profile import database_path
+
+_READ_STATEMENT = re.compile(r"^\s*(select|with|values)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and drop trailing semicolons so trivially different spellings share an entry."""
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def is_read_statement(sql: str) -> bool:
+    return bool(_READ_STATEMENT.match(sql))
+
+
+class ResultCache:
+    """Byte-bounded LRU of query results, invalidated when the database changes."""
+
+    def __init__(self, engine, max_bytes: int, enabled: bool = True):
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.path = database_path(engine.url) if engine.dialect.name == "sqlite" else None
+        # Only on-disk SQLite databases can be watched for changes
+        self.enabled = enabled and max_bytes > 0 and self.path is not None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._validator = None
+        self._probe = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def key(self, sql: str, params: dict | None, cap: int, fmt: str = "rows") -> str:
+        return json.dumps([normalize_sql(sql), params or {}, cap, fmt], sort_keys=True, default=str)
+
+    def _file_state(self) -> tuple:
+        state = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+                state.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def validator(self) -> tuple:
+        """Current (data_version, file state); changes whenever the database content may have."""
+        with self._lock:
+            if self._probe is None:
+                uri = Path(self.path).absolute().as_uri() + "?mode=ro"
+                self._probe = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            cursor = self._probe.cursor()
+            try:
+                data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+            finally:
+                cursor.close()
+        return data_version, self._file_state()
+
+    def get(self, key: str):
+        """Return (cached value or None, validator to pass to put)."""
+        if not self.enabled:
+            return None, None
+        validator = self.validator()
+        with self._lock:
+            if validator != self._validator:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self._validator = validator
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, validator
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], validator
+
+    def put(self, key: str, value, validator):
+        if not self.enabled or validator is None:
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # The database changed while the query ran; the result may already be stale
+            if validator != self._validator:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
@@ -1,43 +1,345 @@
-from fastmcp import FastMCP
-from sqlalchemy import create_engine, text
-import os
+from fastmcp import Context, FastMCP
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.exc import DBAPIError
+from starlette.responses import JSONResponse, PlainTextResponse
+import asyncio, functools, inspect, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Histogram, render as render_metrics, serve_metrics
+except ImportError:
+    # The registry is shared with markitdown_server; appended, not prepended, so db_server's own modules still win
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "markitdown_server"))
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Histogram, render as render_metrics, serve_metrics
+from introspection import SchemaCache
+from result_cache import ResultCache, is_read_statement, normalize_sql
+from columnar import FORMATS, EncodingUnavailable, encode_result, require_encoder
+from export import EXPORT_FORMATS, ExportError, export_path, export_query
+from sqlite_profile import apply_profile, database_path, is_read_only_error, profile_pragmas, read_only_url
+from query_budget import QueryBudget, QueryInterrupted
+from explain import analyze as analyze_plan
+from pagination import CursorRegistry, InvalidCursor, decode_token, encode_token, keyset_query, quote_identifier
+from column_profile import profile_result
 DSN = os.environ.get("DB_DSN", "sqlite+pysqlite:///./app.db")
+TRANSPORT = os.environ.get("DB_TRANSPORT", "stdio")
+HOST = os.environ.get("DB_HOST", "0.0.0.0")
+PORT = int(os.environ.get("DB_PORT", "8003"))
+WORKERS = int(os.environ.get("DB_WORKERS", "8"))
 READ_ONLY = os.environ.get("DB_READONLY", "1") == "1"
+IMMUTABLE = os.environ.get("DB_IMMUTABLE", "0") == "1"
+JOURNAL_MODE = os.environ.get("DB_JOURNAL_MODE", "WAL")
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+PAGE_CACHE_SIZE = int(os.environ.get("DB_PAGE_CACHE_SIZE", "-65536"))
+TEMP_STORE = os.environ.get("DB_TEMP_STORE", "")
 MAX_ROWS = int(os.environ.get("DB_MAX_ROWS", "1000"))
+METRICS_PORT = int(os.environ.get("DB_METRICS_PORT", "0"))
+CACHE_ENABLED = os.environ.get("DB_CACHE", "1") == "1"
+CACHE_MAX_BYTES = int(os.environ.get("DB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CURSOR_IDLE_TIMEOUT = float(os.environ.get("DB_CURSOR_IDLE_TIMEOUT", "60"))
+MAX_CURSORS = int(os.environ.get("DB_MAX_CURSORS", "8"))
+EXPORT_DIR = os.environ.get("DB_EXPORT_DIR", "./exports")
+EXPORT_BATCH_ROWS = int(os.environ.get("DB_EXPORT_BATCH_ROWS", "10000"))
+QUERY_TIMEOUT = float(os.environ.get("DB_QUERY_TIMEOUT", "30"))
+QUERY_MAX_STEPS = int(os.environ.get("DB_QUERY_MAX_STEPS", "0"))
+EXPORT_TIMEOUT = float(os.environ.get("DB_EXPORT_TIMEOUT", "0"))
+PROFILE_TIMEOUT = float(os.environ.get("DB_PROFILE_TIMEOUT", "300"))
+EXPLAIN_LARGE_TABLE = int(os.environ.get("DB_EXPLAIN_LARGE_TABLE", "10000"))
+EXPLAIN_MAX_COST = int(os.environ.get("DB_EXPLAIN_MAX_COST", "0"))
+EXPLAIN_ACTION = os.environ.get("DB_EXPLAIN_ACTION", "warn")
+TOOL_SECONDS = Histogram("db_tool_seconds", "db_server tool latency", ("tool",))
+ROWS_RETURNED = Histogram("db_rows_returned", "Rows returned per call", ("tool",), buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+TOOL_ERRORS = Counter("db_tool_errors_total", "Failed db_server calls by error class", ("tool", "error"))
+QUERY_INTERRUPTS = Counter("db_query_interrupted_total", "Statements stopped by their time or VM step budget, or cancelled", ("tool", "reason"))
+EXPENSIVE_PLANS = Counter("db_query_expensive_plans_total", "db_query plans over DB_EXPLAIN_MAX_COST", ("action",))
+QUERY_INTERRUPTED_SECONDS = Counter("db_query_interrupted_seconds_total", "Time spent in statements that were then stopped", ("tool", "reason"))
+def timed(tool):
+    """Record latency, rows returned and errors of a tool (sync or async) in the metrics registry."""
+    def observe(out, started):
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool=tool)
+        if isinstance(out, dict) and "rowCount" in out:
+            ROWS_RETURNED.observe(out["rowCount"], tool=tool)
+        elif isinstance(out, dict) and "error" in out:
+            TOOL_ERRORS.inc(tool=tool, error="Rejected")
+        return out
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    out = await fn(*args, **kwargs)
+                except Exception as e:
+                    TOOL_ERRORS.inc(tool=tool, error=type(e).__name__)
+                    TOOL_SECONDS.observe(time.perf_counter() - started, tool=tool)
+                    raise
+                return observe(out, started)
+            return async_wrapper
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                out = fn(*args, **kwargs)
+            except Exception as e:
+                TOOL_ERRORS.inc(tool=tool, error=type(e).__name__)
+                TOOL_SECONDS.observe(time.perf_counter() - started, tool=tool)
+                raise
+            return observe(out, started)
+        return wrapper
+    return decorate
 app = FastMCP(name="db-tools", instructions="Safe SQLite access for previews and queries")
-engine = create_engine(DSN, future=True)
+url = make_url(DSN)
+IS_SQLITE = url.get_backend_name() == "sqlite"
+# One connection per worker thread, plus held cursors; never more
+POOL_SIZE = WORKERS + MAX_CURSORS
+pool_args = {} if IS_SQLITE and database_path(url) is None else {"pool_size": POOL_SIZE, "max_overflow": 0, "pool_use_lifo": True}
+engine = create_engine(read_only_url(url, IMMUTABLE) if IS_SQLITE and READ_ONLY else url, future=True, **pool_args)
+workers = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="db-tool")
+def offloaded(fn):
+    """Run a blocking tool on the worker threads so the event loop keeps serving other sessions."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(workers, functools.partial(fn, *args, **kwargs))
+    return wrapper
+if IS_SQLITE:
+    apply_profile(engine, profile_pragmas(READ_ONLY, JOURNAL_MODE, MMAP_SIZE, PAGE_CACHE_SIZE, TEMP_STORE))
+schema_cache = SchemaCache()
+result_cache = ResultCache(engine, CACHE_MAX_BYTES, CACHE_ENABLED)
+def query_budget(timeout: float | None = None) -> QueryBudget:
+    """Budget for one interactive statement; a per-call timeout may only tighten DB_QUERY_TIMEOUT."""
+    seconds = min(timeout, QUERY_TIMEOUT) if timeout and QUERY_TIMEOUT else timeout or QUERY_TIMEOUT
+    return QueryBudget(seconds, QUERY_MAX_STEPS)
+def interrupted(tool: str, e: QueryInterrupted) -> dict:
+    QUERY_INTERRUPTS.inc(tool=tool, reason=e.reason)
+    QUERY_INTERRUPTED_SECONDS.inc(e.seconds, tool=tool, reason=e.reason)
+    return {"error": str(e), "interrupted": e.reason, "seconds": round(e.seconds, 3), "steps": e.steps}
+cursors = CursorRegistry(CURSOR_IDLE_TIMEOUT, MAX_CURSORS, query_budget)
+Counter("db_cache_hits_total", "Result cache hits", fn=lambda: result_cache.hits)
+Counter("db_cache_misses_total", "Result cache misses", fn=lambda: result_cache.misses)
 @app.resource(uri="resource://db/schema", mime_type="text/markdown")
+@offloaded
+@timed("schema_resource")
 def schema_resource():
     with engine.connect() as c:
-        lines = ["| schema | table | column | type |", "|---|---|---|---|"]
-        for (t,) in c.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
-            for col in c.exec_driver_sql(f"PRAGMA table_info('{t}')").fetchall():
-                lines.append(f"| main | {t} | {col[1]} | {col[2]} |")
-        return "\n".join(lines)
+        return schema_cache.get(c)[1]
 @app.tool(description="List tables")
+@offloaded
+@timed("db_tables")
 def db_tables():
     with engine.connect() as c:
-        return {"tables": [r[0] for r in c.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]}
-@app.tool(description="Preview first N rows from a table")
-def db_preview(table: str, limit: int = 20):
+        return {"tables": list(schema_cache.get(c)[0])}
+def run_paged(sql: str, params: dict | None, cap: int, budget: QueryBudget):
+    """Run sql and return its first page; if more rows remain the cursor is held and its token returned."""
+    c = engine.connect()
+    try:
+        changes = getattr(c.connection.dbapi_connection, "total_changes", None)
+        with budget.watch(c.connection.dbapi_connection):
+            cur = c.execute(text(sql).execution_options(stream_results=True), params or {})
+            if not cur.returns_rows:
+                # Only reachable with READ_ONLY off; without a commit the write would be rolled back on close
+                c.commit()
+                return [], [], None, True
+            cols = list(cur.keys())
+            rows = budget.fetchmany(cur, cap + 1)
+        changed = getattr(c.connection.dbapi_connection, "total_changes", None) != changes
+        next_cursor = None
+        if len(rows) > cap:
+            next_cursor = cursors.hold(c, cur, cols, rows.pop(), normalize_sql(sql), params)
+            c = None
+        return cols, rows, next_cursor, changed
+    finally:
+        if c is not None:
+            c.close()
+def shaped(cols: list, rows: list, next_cursor: str | None, fmt: str) -> dict:
+    """Encode a page in the requested result format and attach its continuation token."""
+    try:
+        return {**encode_result(cols, rows, fmt), "nextCursor": next_cursor}
+    except BaseException:
+        # Nobody will get the token, so a cursor held behind it would stay open until reaped
+        if next_cursor is not None:
+            cursors.close(next_cursor)
+        raise
+def key_columns(info: dict | None) -> list[str] | None:
+    """Columns a table can be paged by: its rowid, or the primary key of a WITHOUT ROWID table."""
+    if info is None or info["rowid"] is None:
+        return None
+    if info["rowid"]:
+        return ["rowid"]
+    pk = sorted((col["pk"], col["name"]) for col in info["columns"] if col["pk"])
+    return [name for _, name in pk] or None
+def explain_plan(sql: str, params: dict | None) -> dict:
+    with engine.connect() as c:
+        return analyze_plan(c.connection.dbapi_connection, sql, params, schema_cache.get(c)[0], EXPLAIN_LARGE_TABLE)
+@app.tool(description="EXPLAIN QUERY PLAN without running the query: plan tree with row estimates, estimated cost, full scans of large tables and index suggestions")
+@offloaded
+@timed("db_explain")
+def db_explain(sql: str, params: dict | None = None):
+    if not IS_SQLITE:
+        return {"error": "db_explain needs a SQLite database"}
+    try:
+        return explain_plan(sql, params)
+    except Exception as e:
+        return {"error": f"cannot explain query: {e}"}
+FORMAT_HELP = "format: rows (default), columnar (typed arrays, dictionary strings, null bitmap), arrow or parquet (base64, needs pyarrow)"
+@app.tool(description="Preview N rows from a table; pass nextCursor back as cursor for the following page; " + FORMAT_HELP)
+@offloaded
+@timed("db_preview")
+def db_preview(table: str, limit: int = 20, cursor: str | None = None, format: str = "rows"):
+    if format not in FORMATS:
+        return {"error": f"format must be one of {', '.join(FORMATS)}"}
     limit = max(1, min(limit, 200))
     with engine.connect() as c:
-        res = c.exec_driver_sql(f"SELECT * FROM {table} LIMIT {limit}").fetchmany(limit)
-        cols = res[0].keys() if res else []
-        return {"columns": list(cols), "rows": [list(r) for r in res]}
-@app.tool(description="Run parameterized SQL; caps rows; blocks writes when READ_ONLY")
-def db_query(sql: str, params: dict | None = None, max_rows: int = 200):
-    if READ_ONLY and any(k in sql.lower() for k in ["insert ","update ","delete ","alter ","drop ","truncate ","create "]):
+        keys = key_columns(schema_cache.get(c)[0].get(table))
+    try:
+        require_encoder(format)
+        if keys is None:
+            # Views, or tables SQLite is too old to classify: hold the cursor instead of seeking by key
+            sql = f"SELECT * FROM {table}"
+            if cursor:
+                return shaped(*cursors.fetch(cursor, normalize_sql(sql), None, limit), format)
+            cols, rows, next_cursor, _ = run_paged(sql, None, limit, query_budget())
+            return shaped(cols, rows, next_cursor, format)
+        after = None
+        if cursor:
+            state = decode_token(cursor)
+            if state.get("t") != table or not isinstance(state.get("k"), list) or len(state["k"]) != len(keys):
+                return {"error": "cursor belongs to a different table"}
+            after = state["k"]
+        sql, params = keyset_query(table, keys, after, limit)
+        key = result_cache.key(sql, params, limit, format)
+        cached, version = result_cache.get(key)
+        if cached is not None:
+            return cached
+        with engine.connect() as c, query_budget().watch(c.connection.dbapi_connection) as budget:
+            res = c.execute(text(sql), params)
+            cols = list(res.keys())[len(keys):]
+            page = budget.fetchmany(res, limit + 1)
+        next_cursor = encode_token({"t": table, "k": list(page[limit - 1][:len(keys)])}) if len(page) > limit else None
+        out = shaped(cols, [r[len(keys):] for r in page[:limit]], next_cursor, format)
+    except (InvalidCursor, EncodingUnavailable) as e:
+        return {"error": str(e)}
+    except QueryInterrupted as e:
+        return interrupted("db_preview", e)
+    result_cache.put(key, out, version)
+    return out
+def writes_blocked(sql: str) -> bool:
+    # SQLite enforces READ_ONLY itself (mode=ro, query_only); other backends keep the keyword guard
+    return READ_ONLY and not IS_SQLITE and any(k in sql.lower() for k in ["insert ","update ","delete ","alter ","drop ","truncate ","create "])
+@app.tool(description="Run parameterized SQL; caps rows; blocks writes when READ_ONLY; stops after DB_QUERY_TIMEOUT seconds (timeout may lower it); pass nextCursor back as cursor (with the same sql and params) for the following page; " + FORMAT_HELP)
+@offloaded
+@timed("db_query")
+def db_query(sql: str, params: dict | None = None, max_rows: int = 200, cursor: str | None = None, format: str = "rows", timeout: float | None = None):
+    if writes_blocked(sql):
         return {"error": "write operations are disabled"}
-    cap = min(max_rows, MAX_ROWS)
-    rows = []
+    if format not in FORMATS:
+        return {"error": f"format must be one of {', '.join(FORMATS)}"}
+    # At least one row: an empty page would hand back the same cursor forever
+    cap = max(1, min(max_rows, MAX_ROWS))
+    warnings = []
+    try:
+        require_encoder(format)
+        if cursor:
+            return shaped(*cursors.fetch(cursor, normalize_sql(sql), params, cap), format)
+        key = result_cache.key(sql, params, cap, format)
+        cached, version = result_cache.get(key) if is_read_statement(sql) else (None, None)
+        if cached is not None:
+            return cached
+        if EXPLAIN_MAX_COST and IS_SQLITE and is_read_statement(sql):
+            plan = explain_plan(sql, params)
+            if plan["estimatedCost"] > EXPLAIN_MAX_COST:
+                EXPENSIVE_PLANS.inc(action=EXPLAIN_ACTION)
+                message = f"estimated cost ~{plan['estimatedCost']:,} rows exceeds DB_EXPLAIN_MAX_COST ({EXPLAIN_MAX_COST:,})"
+                if EXPLAIN_ACTION == "refuse":
+                    return {"error": message + "; see db_explain", **{k: plan[k] for k in ("plan", "warnings", "suggestions")}}
+                warnings = [message, *plan["warnings"], *plan["suggestions"]]
+        cols, rows, next_cursor, changed = run_paged(sql, params, cap, query_budget(timeout))
+        out = shaped(cols, rows, next_cursor, format)
+        if warnings:
+            out["warnings"] = warnings
+    except (InvalidCursor, EncodingUnavailable) as e:
+        return {"error": str(e)}
+    except QueryInterrupted as e:
+        return {**interrupted("db_query", e), **({"warnings": warnings} if warnings else {})}
+    except DBAPIError as e:
+        if is_read_only_error(e):
+            return {"error": "write operations are disabled"}
+        raise
+    # Pages backed by a held cursor are single-use and never cached
+    if not changed and next_cursor is None:
+        result_cache.put(key, out, version)
+    return out
+@app.tool(description="Profile a table in one scan: per column nulls, min, max, mean, approximate distinct count (HyperLogLog) and top_k values (count-min sketch); sample > 0 adds a uniform reservoir sample of rows")
+@offloaded
+@timed("db_profile")
+def db_profile(table: str, columns: list[str] | None = None, top_k: int = 5, sample: int = 0):
     with engine.connect() as c:
-        cur = c.execute(text(sql).execution_options(stream_results=True), params or {})
-        cols = cur.keys()
-        for i, r in enumerate(cur):
-            if i >= cap: break
-            rows.append(list(r))
-    return {"columns": list(cols), "rows": rows, "rowCount": len(rows)}
+        info = schema_cache.get(c)[0].get(table)
+    if info is None:
+        return {"error": f"unknown table {table!r}"}
+    names = [col["name"] for col in info["columns"]]
+    unknown = [name for name in columns or [] if name not in names]
+    if unknown:
+        return {"error": f"unknown columns: {', '.join(unknown)}"}
+    sql = f"SELECT {', '.join(map(quote_identifier, columns or names))} FROM {quote_identifier(table)}"
+    budget = QueryBudget(PROFILE_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        with engine.connect() as c, budget.watch(c.connection.dbapi_connection):
+            result = c.execute(text(sql).execution_options(stream_results=True))
+            out = profile_result(result, top_k=max(1, min(top_k, 50)), sample=max(0, min(sample, MAX_ROWS)), budget=budget)
+    except QueryInterrupted as e:
+        return interrupted("db_profile", e)
+    return {"table": table, **out, "approximate": ["distinct", "top"], "seconds": round(time.perf_counter() - started, 3)}
+@app.tool(description="Stream a query result to a CSV, NDJSON or Parquet file under DB_EXPORT_DIR in batches (no row cap); an existing file is kept unless overwrite is true; reports progress, returns path, rowCount and bytes")
+@timed("db_export")
+async def db_export(sql: str, params: dict | None = None, format: str = "csv", filename: str | None = None, overwrite: bool = False, ctx: Context | None = None):
+    if not is_read_statement(sql):
+        return {"error": "only SELECT, WITH or VALUES statements can be exported"}
+    # A WITH statement can still modify data (e.g. WITH ... DELETE on PostgreSQL)
+    if writes_blocked(sql):
+        return {"error": "write operations are disabled"}
+    if format not in EXPORT_FORMATS:
+        return {"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}
+    loop = asyncio.get_running_loop()
+    def progress(rows, size):
+        if ctx is not None:
+            asyncio.run_coroutine_threadsafe(ctx.report_progress(rows, None, f"{rows} rows, {size} bytes written"), loop)
+    budget = QueryBudget(EXPORT_TIMEOUT)
+    try:
+        path = export_path(EXPORT_DIR, filename, format)
+        # Runs on a worker thread so the event loop keeps serving progress notifications and other calls
+        return await loop.run_in_executor(workers, export_query, engine, sql, params, path, format, EXPORT_BATCH_ROWS, progress, budget, overwrite)
+    except (ExportError, EncodingUnavailable) as e:
+        return {"error": str(e)}
+    except QueryInterrupted as e:
+        return interrupted("db_export", e)
+    except asyncio.CancelledError:
+        # The client gave up; stop the statement at its next progress check instead of finishing the file
+        budget.cancel()
+        raise
+@app.tool(description="Close a db_query/db_preview cursor that will not be read to the end")
+def db_close_cursor(cursor: str):
+    try:
+        return {"closed": cursors.close(cursor)}
+    except InvalidCursor as e:
+        return {"error": str(e)}
+@app.tool(description="Result cache statistics: entries, bytes, hits, misses, invalidations")
+def db_cache_stats():
+    return result_cache.stats()
+@app.tool(description="Prometheus text metrics: tool latency, rows returned, errors")
+def db_metrics():
+    return render_metrics()
+
+@app.custom_route("/metrics", methods=["GET"])
+async def metrics_route(request):
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+@app.custom_route("/health", methods=["GET"])
+async def health_route(request):
+    return JSONResponse({"status": "healthy", "transport": TRANSPORT, "workers": WORKERS, "pool": engine.pool.status(), "cursors": cursors.stats(), "cache": result_cache.stats()})
 
 if __name__ == "__main__":
-    app.run()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    if TRANSPORT == "stdio":
+        app.run()
+    else:
+        # Streamable HTTP: one process, one engine and one set of warm page caches for every session
+        app.run(transport=TRANSPORT, host=HOST, port=PORT)
@@ -0,0 +1,77 @@
+"""
+SQLite Connection Profile
+
+Pragmas applied to every pooled SQLite connection as it is opened (WAL
+journal, memory-mapped I/O, page cache size, in-memory temp storage) and
+the read-only setup: the database file is opened through a mode=ro URI,
+optionally with immutable=1, and query_only is switched on, so SQLite
+itself refuses writes rather than a scan of the SQL text.
+"""
+
+import os
+
+from sqlalchemy import event
+
+SQLITE_READONLY = 8
+
+
+def is_memory_database(database: str | None) -> bool:
+    return database in (None, "", ":memory:") or database.startswith("file::memory:") or "mode=memory" in database
+
+
+def database_path(url) -> str | None:
+    """Filesystem path of a SQLite URL, with any file: URI prefix removed; None for in-memory databases."""
+    database = url.database
+    if is_memory_database(database):
+        return None
+    if database.startswith("file:"):
+        database = database[len("file:"):].split("?", 1)[0]
+    return database
+
+
+def read_only_url(url, immutable: bool = False):
+    """url reopened as a mode=ro URI; immutable=1 is added only if asked for and no WAL content is pending."""
+    path = database_path(url)
+    if path is None:
+        return url
+    query = dict(url.query)
+    query.update({"uri": "true", "mode": "ro"})
+    # immutable skips locking and change detection entirely, so it would miss
+    # transactions still sitting in the WAL; only use it on a checkpointed file
+    wal = path + "-wal"
+    if immutable and not (os.path.exists(wal) and os.path.getsize(wal) > 0):
+        query["immutable"] = "1"
+    return url.set(database="file:" + path, query=query)
+
+
+def profile_pragmas(read_only: bool, journal_mode: str, mmap_size: int, cache_size: int, temp_store: str) -> list:
+    """(pragma, value) pairs for a new connection, in the order they must be applied."""
+    pragmas = []
+    # The journal mode is stored in the database file, which a read-only connection cannot change
+    if journal_mode and not read_only:
+        pragmas.append(("journal_mode", journal_mode))
+    pragmas += [("mmap_size", mmap_size), ("cache_size", cache_size)]
+    if temp_store:
+        pragmas.append(("temp_store", temp_store))
+    if read_only:
+        pragmas.append(("query_only", "ON"))
+    return pragmas
+
+
+def apply_profile(engine, pragmas: list):
+    """Run pragmas on every DBAPI connection the engine's pool opens."""
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def is_read_only_error(error) -> bool:
+    """Whether a DBAPI error is SQLite refusing a write (SQLITE_READONLY and its extended codes)."""
+    code = getattr(getattr(error, "orig", error), "sqlite_errorcode", None)
+    return code is not None and code & 0xFF == SQLITE_READONLY
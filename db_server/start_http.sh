@@ -0,0 +1,9 @@
+#!/bin/bash
+
+# Start the database MCP server over streamable HTTP
+
+# Activate virtual environment
+source "$(dirname "$0")/../.venv/bin/activate"
+
+# Start the database server on DB_PORT (default 8003)
+DB_TRANSPORT=http python "$(dirname "$0")/server.py"
@@ -0,0 +1,41 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# db_server's modules import each other by bare name, as when server.py runs as a script
+DB_SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DB_SERVER)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """On-disk SQLite database with one 5000-row table t(id, a, b, c)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as c:
+        c.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, b TEXT, c INTEGER)")
+        c.execute(text("INSERT INTO t (a, b, c) VALUES (:a, :b, :c)"),
+                  [{"a": i % 100, "b": str(i), "c": i} for i in range(5000)])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """db_server's server module, loaded once against its own copy of the test database."""
+    path = tmp_path_factory.mktemp("server") / "server.db"
+    seed = create_engine(f"sqlite:///{path}")
+    with seed.begin() as c:
+        c.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, b TEXT, c INTEGER)")
+        c.execute(text("INSERT INTO t (a, b, c) VALUES (:a, :b, :c)"),
+                  [{"a": i % 100, "b": str(i), "c": i} for i in range(5000)])
+    seed.dispose()
+    os.environ["DB_DSN"] = f"sqlite+pysqlite:///{path}"
+    # Loaded by path: markitdown_server has a server.py of its own
+    spec = importlib.util.spec_from_file_location("db_server_app", os.path.join(DB_SERVER, "server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    module.engine.dispose()
@@ -0,0 +1,83 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+from sqlalchemy import text
+
+from column_profile import ColumnProfile, CountMinSketch, HyperLogLog, Reservoir, _hashes, profile_result
+
+
+@pytest.mark.parametrize("n", [100, 20_000, 300_000])
+def test_hyperloglog_within_about_one_percent(n):
+    hll = HyperLogLog()
+    # Offset so the runs do not share values; ints hash the same in every process
+    hll.add_hashes(_hashes(range(7 * n, 8 * n)))
+    # 0.81% standard error at the default precision; three of them allow for an unlucky run
+    assert abs(hll.count() - n) <= 0.025 * n
+
+
+def test_hyperloglog_ignores_repeats():
+    hll = HyperLogLog()
+    for _ in range(5):
+        hll.add_hashes(_hashes(range(10_000)))
+    assert abs(hll.count() - 10_000) <= 250
+
+
+def test_count_min_never_undercounts_and_rarely_exceeds_its_bound():
+    rng = random.Random(3)
+    stream = [int(rng.paretovariate(1.1)) for _ in range(200_000)]
+    truth = Counter(stream)
+    sketch = CountMinSketch()
+    values = list(truth)
+    sketch.add_hashes(_hashes(values), [truth[v] for v in values])
+    assert sketch.total == len(stream)
+    over = [sketch.estimate(h) - truth[v] for v, h in zip(values, _hashes(values))]
+    assert min(over) >= 0
+    # Each estimate is within total * e / width except with probability e ** -depth
+    beyond = sum(o > sketch.error for o in over)
+    assert beyond <= max(1, 2 * math.exp(-sketch.depth) * len(values))
+
+
+def test_top_values_are_the_heavy_hitters():
+    column = ColumnProfile("v", top_k=3)
+    rng = random.Random(5)
+    values = [1] * 5000 + [2] * 3000 + [3] * 2000 + [rng.randrange(10, 10**9) for _ in range(50_000)]
+    rng.shuffle(values)
+    for start in range(0, len(values), 7000):
+        column.add(values[start:start + 7000])
+    top = column.result()["top"]
+    assert [v for v, _ in top] == [1, 2, 3]
+    assert all(c >= true for (_, c), true in zip(top, [5000, 3000, 2000]))
+
+
+def test_reservoir_is_uniform():
+    n, k, runs = 10_000, 100, 200
+    deciles = Counter()
+    for seed in range(runs):
+        reservoir = Reservoir(k, seed=seed)
+        rows = list(range(n))
+        # Uneven batches: the sample must not depend on where batches split
+        for start, size in zip(range(0, n, 1234), [1234] * 9):
+            reservoir.add(rows[start:start + size])
+        assert reservoir.seen == n and len(set(reservoir.rows)) == k
+        deciles.update(r * 10 // n for r in reservoir.rows)
+    expected = runs * k / 10
+    assert all(abs(deciles[d] - expected) <= 0.1 * expected for d in range(10))
+
+
+def test_reservoir_keeps_short_streams_whole():
+    reservoir = Reservoir(50, seed=1)
+    reservoir.add(list(range(30)))
+    assert sorted(reservoir.rows) == list(range(30))
+
+
+def test_profile_result(engine):
+    with engine.connect() as c:
+        out = profile_result(c.execute(text("SELECT a, c FROM t")), batch_rows=700, sample=10)
+    a, c = out["columns"]
+    assert out["rows"] == 5000 and len(out["sample"]["rows"]) == 10
+    assert abs(a["distinct"] - 100) <= 1 and (a["min"], a["max"]) == (0, 99)
+    assert abs(c["distinct"] - 5000) <= 125
+    # Every value of a unique column ties, so none clears the sketch's error bound
+    assert c["top"] == []
@@ -0,0 +1,46 @@
+import base64
+import datetime
+import decimal
+import uuid
+
+import pytest
+
+from columnar import encode_columnar, encode_result
+
+
+def column(values):
+    return encode_columnar(["v"], [(v,) for v in values])["columns"][0]
+
+
+def test_mixed_column_values_stay_json():
+    when = datetime.datetime(2024, 5, 6, 7, 8, 9)
+    key = uuid.UUID(int=1)
+    values = [1, "a", decimal.Decimal("1.50"), when, when.date(), when.time(), key, b"\x00\xff", None]
+    col = column(values)
+    assert col["type"] == "mixed"
+    assert col["data"] == [
+        1, "a", "1.50", "2024-05-06T07:08:09", "2024-05-06", "07:08:09", str(key), base64.b64encode(b"\x00\xff").decode(), None,
+    ]
+
+
+def test_column_of_decimals_is_mixed_text():
+    assert column([decimal.Decimal("2.25"), None])["data"] == ["2.25", None]
+
+
+@pytest.mark.parametrize("values, type_", [
+    ([1, 2, None], "int8"),
+    ([1, 70000], "int32"),
+    ([1.5, 2], "float64"),
+    ([b"x", bytearray(b"y")], "binary"),
+])
+def test_column_types(values, type_):
+    assert column(values)["type"] == type_
+
+
+def test_nulls_bitmap():
+    bitmap = base64.b64decode(column([1, None, 3, None, None, None, None, None, 9])["nulls"])
+    assert bitmap == bytes([0b00000101, 0b00000001])
+
+
+def test_rows_format():
+    assert encode_result(["a"], [(1,), (2,)]) == {"columns": ["a"], "rows": [[1], [2]], "rowCount": 2}
@@ -0,0 +1,36 @@
+import pytest
+
+from explain import analyze
+from introspection import SchemaCache
+
+
+def suggestions(engine, sql, params=None):
+    with engine.connect() as c:
+        tables = SchemaCache().get(c)[0]
+        return analyze(c.connection.dbapi_connection, sql, params, tables, large_table_rows=1000)["suggestions"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT b FROM t WHERE a = 5",
+    "SELECT b FROM t WHERE t.a = 5",
+    "SELECT b FROM t x WHERE x.a = 5",
+    "SELECT b FROM t AS x WHERE x.a = 5",
+])
+def test_filter_is_advised_bare_qualified_or_aliased(engine, sql):
+    assert suggestions(engine, sql) == ['covering index for t: CREATE INDEX "idx_t_a_b" ON "t" ("a", "b")']
+
+
+def test_bound_parameters_are_not_columns(engine):
+    assert suggestions(engine, "SELECT * FROM t WHERE c > :a", {"a": 1}) == ['index for t: CREATE INDEX "idx_t_c" ON "t" ("c")']
+
+
+def test_string_literals_are_not_sql(engine):
+    advice = suggestions(engine, "SELECT b FROM t WHERE b = 'a = 1' AND c = :v", {"v": 1})
+    assert advice == ['index for t: CREATE INDEX "idx_t_b_c" ON "t" ("b", "c")']
+
+
+def test_other_qualifier_is_not_this_table(engine):
+    with engine.begin() as c:
+        c.exec_driver_sql("CREATE TABLE u (id INTEGER PRIMARY KEY, a INTEGER)")
+    advice = suggestions(engine, "SELECT t.b FROM t, u WHERE u.a = 5 AND t.c = u.id")
+    assert not any('"a"' in s and '"t"' in s for s in advice)
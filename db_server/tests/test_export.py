@@ -0,0 +1,70 @@
+import errno
+import os
+import threading
+
+import pytest
+
+from export import ExportError, FILE_MODE, export_query
+
+SQL = "SELECT id, b FROM t WHERE id <= :n ORDER BY id"
+
+
+@pytest.fixture
+def exports(tmp_path):
+    """Empty export directory, apart from the database the engine fixture keeps in tmp_path."""
+    return tmp_path / "exports"
+
+
+def test_csv_export(engine, exports):
+    path = str(exports / "out.csv")
+    out = export_query(engine, SQL, {"n": 3}, path, "csv", 2)
+    assert out["rowCount"] == 3
+    assert open(path).read().splitlines() == ["id,b", "1,0", "2,1", "3,2"]
+    assert os.stat(path).st_mode & 0o777 == FILE_MODE
+    assert os.listdir(exports) == ["out.csv"]
+
+
+def test_existing_file_needs_overwrite(engine, exports):
+    path = str(exports / "out.ndjson")
+    export_query(engine, SQL, {"n": 1}, path, "ndjson", 10)
+    with pytest.raises(ExportError, match="already exists"):
+        export_query(engine, SQL, {"n": 2}, path, "ndjson", 10)
+    assert export_query(engine, SQL, {"n": 2}, path, "ndjson", 10, overwrite=True)["rowCount"] == 2
+    assert os.listdir(exports) == ["out.ndjson"]
+
+
+def test_concurrent_exports_to_one_name(engine, exports):
+    path = str(exports / "out.csv")
+    outcomes = []
+
+    def run():
+        try:
+            outcomes.append(export_query(engine, SQL, {"n": 5000}, path, "csv", 100)["rowCount"])
+        except ExportError as e:
+            outcomes.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 5000 in outcomes
+    assert all(o == 5000 or "already exists" in o for o in outcomes)
+    assert len(open(path).read().splitlines()) == 5001
+    assert os.listdir(exports) == ["out.csv"]
+
+
+def test_no_hard_links_is_a_clear_error(engine, exports, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+
+    monkeypatch.setattr(os, "link", link)
+    with pytest.raises(ExportError, match="hard links"):
+        export_query(engine, SQL, {"n": 3}, str(exports / "out.csv"), "csv", 2)
+    assert not os.path.exists(exports) or os.listdir(exports) == []
+
+
+def test_failed_query_leaves_nothing_behind(engine, exports):
+    with pytest.raises(Exception):
+        export_query(engine, "SELECT nope FROM t", None, str(exports / "out.csv"), "csv", 2)
+    assert not os.path.exists(exports) or os.listdir(exports) == []
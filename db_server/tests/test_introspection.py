@@ -0,0 +1,39 @@
+import sqlite3
+
+from introspection import SchemaCache
+from sqlite_profile import database_path
+
+
+def test_schema_is_read_once_until_it_changes(engine):
+    cache = SchemaCache()
+    with engine.connect() as c:
+        tables, markdown = cache.get(c)
+        assert cache.get(c)[0] is tables
+    assert cache.refreshes == 1
+    assert [col["name"] for col in tables["t"]["columns"]] == ["id", "a", "b", "c"]
+    assert tables["t"]["rows"] == {"estimate": 5000, "source": "max(rowid)"}
+    assert "| main | t | id | INTEGER | 1 |" in markdown
+
+    # A schema change made outside the engine is picked up on the next call
+    other = sqlite3.connect(database_path(engine.url))
+    other.executescript("""
+        CREATE TABLE u (id INTEGER PRIMARY KEY, t_id INTEGER REFERENCES t(id));
+        CREATE INDEX idx_t_a ON t (a);
+        CREATE TABLE w (k TEXT PRIMARY KEY, v) WITHOUT ROWID;
+    """)
+    other.close()
+    with engine.connect() as c:
+        tables = cache.get(c)[0]
+    assert cache.refreshes == 2
+    assert {"name": "idx_t_a", "columns": "a", "unique": False, "origin": "c"} in tables["t"]["indexes"]
+    assert tables["u"]["foreign_keys"][0]["references"] == "t(id)"
+    assert tables["t"]["rowid"] is not False and tables["w"]["rowid"] is not True
+
+
+def test_row_estimates_prefer_sqlite_stat1(engine):
+    with engine.begin() as c:
+        c.exec_driver_sql("CREATE INDEX idx_t_b ON t (b)")
+        c.exec_driver_sql("DELETE FROM t WHERE id > 4000")
+        c.exec_driver_sql("ANALYZE")
+    with engine.connect() as c:
+        assert SchemaCache().get(c)[0]["t"]["rows"] == {"estimate": 4000, "source": "sqlite_stat1"}
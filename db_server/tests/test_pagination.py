@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from pagination import InvalidCursor
+
+SQL = "SELECT id FROM t WHERE id > :m ORDER BY id"
+
+
+def call(tool, *args, **kwargs):
+    """Run a (possibly offloaded, async) tool function and return its result."""
+    out = tool.fn(*args, **kwargs)
+    return asyncio.run(out) if asyncio.iscoroutine(out) else out
+
+
+def walk(server, max_rows, limit=10):
+    """ids of every page of SQL, following nextCursor; fails if it does not end within limit pages."""
+    out = call(server.db_query, SQL, {"m": 4990}, max_rows)
+    ids = [row[0] for row in out["rows"]]
+    for _ in range(limit):
+        if out["nextCursor"] is None:
+            return ids
+        out = call(server.db_query, SQL, {"m": 4990}, max_rows, out["nextCursor"])
+        ids += [row[0] for row in out["rows"]]
+    pytest.fail("pagination did not finish")
+
+
+@pytest.mark.parametrize("max_rows", [0, -5])
+def test_max_rows_below_one_still_makes_progress(server, max_rows):
+    assert walk(server, max_rows) == list(range(4991, 5001))
+    assert server.cursors.stats()["open"] == 0
+
+
+def test_pages_cover_the_result_once(server):
+    assert walk(server, 3) == list(range(4991, 5001))
+    assert server.cursors.stats()["open"] == 0
+
+
+def test_cursor_is_bound_to_params(server):
+    first = call(server.db_query, SQL, {"m": 10}, 2)
+    assert first["nextCursor"]
+    assert "error" in call(server.db_query, SQL, {"m": 500}, 2, first["nextCursor"])
+    assert "error" in call(server.db_query, SQL + " ", {"m": 10, "x": 1}, 2, first["nextCursor"])
+    following = call(server.db_query, SQL, {"m": 10}, 2, first["nextCursor"])
+    assert [row[0] for row in following["rows"]] == [13, 14]
+    assert call(server.db_close_cursor, following["nextCursor"]) == {"closed": True}
+
+
+def test_registry_rejects_unknown_tokens(server):
+    with pytest.raises(InvalidCursor):
+        server.cursors.fetch("bm90LWEtdG9rZW4", SQL, None, 1)
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import text
+
+from query_budget import QueryBudget, QueryInterrupted
+
+# Every row costs a scan of t, so rows trickle out while the step budget runs down
+SLOW = "WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r) SELECT x, (SELECT count(*) FROM t WHERE c > x) FROM r"
+
+
+def test_interrupt_reports_rows_already_returned(engine):
+    budget = QueryBudget(max_steps=2_000_000)
+    with engine.connect() as c:
+        with pytest.raises(QueryInterrupted) as info:
+            with budget.watch(c.connection.dbapi_connection):
+                budget.fetchmany(c.execute(text(SLOW)), 10**9)
+    assert info.value.reason == "steps"
+    assert budget.rows > 0
+    assert f"{budget.rows:,} rows returned" in str(info.value)
+
+
+def test_fetchmany_stops_at_n_and_at_the_end(engine):
+    budget = QueryBudget()
+    with engine.connect() as c:
+        with budget.watch(c.connection.dbapi_connection):
+            assert len(budget.fetchmany(c.execute(text("SELECT id FROM t")), 7)) == 7
+            assert len(budget.fetchmany(c.execute(text("SELECT id FROM t WHERE id <= 3")), 7)) == 3
+    assert budget.rows == 10
+
+
+def test_cancelled_budget_stops_the_statement(engine):
+    budget = QueryBudget()
+    budget.cancel()
+    with engine.connect() as c:
+        with pytest.raises(QueryInterrupted) as info:
+            with budget.watch(c.connection.dbapi_connection):
+                budget.fetchmany(c.execute(text(SLOW)), 10**9)
+    assert info.value.reason == "cancelled"
@@ -0,0 +1,58 @@
+import sqlite3
+
+from sqlalchemy import create_engine
+
+from result_cache import ResultCache
+from sqlite_profile import database_path
+
+
+def cached(cache, key):
+    return cache.get(key)[0]
+
+
+def test_hit_until_another_connection_commits(engine):
+    cache = ResultCache(engine, 1 << 20)
+    key = cache.key("SELECT  count(*) FROM t;", None, 10)
+    assert cache.key("SELECT count(*) FROM t", None, 10) == key
+    value, validator = cache.get(key)
+    assert value is None
+    cache.put(key, {"rows": [[5000]]}, validator)
+    assert cached(cache, key) == {"rows": [[5000]]}
+
+    # A writer outside the engine and its pool, as another process would be
+    writer = sqlite3.connect(database_path(engine.url))
+    writer.execute("DELETE FROM t WHERE id = 1")
+    writer.commit()
+    writer.close()
+    assert cached(cache, key) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_result_computed_across_a_change_is_not_stored(engine):
+    cache = ResultCache(engine, 1 << 20)
+    key = cache.key("SELECT 1", None, 10)
+    _, validator = cache.get(key)
+    with engine.begin() as c:
+        c.exec_driver_sql("UPDATE t SET a = a + 1 WHERE id = 2")
+    cache.put(key, {"rows": [[1]]}, validator)
+    assert cached(cache, key) is None
+
+
+def test_probe_stays_outside_the_pool(engine):
+    cache = ResultCache(engine, 1 << 20)
+    cache.get(cache.key("SELECT 1", None, 10))
+    assert engine.pool.checkedout() == 0
+
+
+def test_lru_bounded_by_bytes(engine):
+    cache = ResultCache(engine, 200)
+    _, validator = cache.get("probe")
+    for i in range(10):
+        cache.put(f"k{i}", {"rows": "x" * 40}, validator)
+    stats = cache.stats()
+    assert stats["bytes"] <= 200 and stats["evictions"] > 0
+    assert cached(cache, "k9") is not None and cached(cache, "k0") is None
+
+
+def test_memory_databases_are_not_cached():
+    assert not ResultCache(create_engine("sqlite://"), 1 << 20).enabled
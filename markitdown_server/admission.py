@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Admission Control
+
+Weighted concurrency budget in front of the convert endpoints. Each request
+costs a number of units depending on its format (a PDF or PPTX costs more
+than a TXT); requests that do not fit wait in a bounded FIFO queue, and once
+that queue is full they are turned away at once with AdmissionRejected, which
+the servers map to 429 with a Retry-After estimate.
+"""
+
+import asyncio
+import collections
+import os
+import time
+from pathlib import Path
+
+from starlette.responses import StreamingResponse
+
+from single_flight import get_flights, tool_flight_key
+
+# Configuration
+ADMISSION_BUDGET = int(os.environ.get("MARKITDOWN_ADMISSION_BUDGET", "16"))
+ADMISSION_QUEUE = int(os.environ.get("MARKITDOWN_ADMISSION_QUEUE", "32"))
+ADMISSION_TIMEOUT = float(os.environ.get("MARKITDOWN_ADMISSION_TIMEOUT", "30"))
+
+# Relative cost per format; MARKITDOWN_COST_<EXT> (e.g. MARKITDOWN_COST_PDF) overrides
+DEFAULT_COSTS = {
+    "pdf": 4, "pptx": 4, "xlsx": 3, "docx": 2, "wav": 4,
+    "jpg": 2, "jpeg": 2, "png": 2, "gif": 2,
+    "html": 1, "txt": 1, "json": 1, "xml": 1,
+    "url": 2,
+}
+DEFAULT_COST = 2
+
+
+def cost_for(extension: str) -> int:
+    """Cost of converting one document of the given extension (or 'url')."""
+    ext = extension.lower().lstrip(".")
+    override = os.environ.get(f"MARKITDOWN_COST_{ext.upper()}") if ext else None
+    if override:
+        return int(override)
+    return DEFAULT_COSTS.get(ext, DEFAULT_COST)
+
+
+def tool_cost(tool_name: str, args: dict) -> int:
+    """Cost of an MCP tool call; 0 for calls that do no conversion."""
+    if tool_name == "convert_file":
+        return cost_for(Path(args.get("path") or "").suffix)
+    if tool_name == "convert_url":
+        return cost_for("url")
+    if tool_name == "convert_batch":
+        return sum(cost_for(Path(p).suffix) for p in args.get("paths") or [])
+    return 0
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Permit:
+    """Admitted share of the budget; release() is idempotent."""
+
+    def __init__(self, controller, cost: int):
+        self._controller = controller
+        self.cost = cost
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """Weighted semaphore with a bounded FIFO wait queue; use from one event loop."""
+
+    def __init__(self, budget: int = ADMISSION_BUDGET, queue_limit: int = ADMISSION_QUEUE,
+                 timeout: float = ADMISSION_TIMEOUT):
+        self.budget = max(1, budget)
+        self.queue_limit = max(0, queue_limit)
+        self.timeout = timeout
+        self.in_use = 0
+        self.in_flight = 0
+        self._waiters = collections.deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        # Average seconds a permit is held per unit of cost, for Retry-After
+        self._hold_per_unit = 1.0
+        # (admitted_at, wait) of recent admissions, for the p95 wait
+        self._recent_waits = collections.deque(maxlen=1024)
+
+    async def acquire(self, cost: int) -> Permit:
+        """Wait for cost units of budget; raises AdmissionRejected when the queue is full or the wait times out."""
+        # A request larger than the whole budget runs alone rather than never
+        cost = min(max(0, cost), self.budget)
+        started = time.monotonic()
+
+        if cost == 0 or (not self._waiters and self.in_use + cost <= self.budget):
+            return self._admit(cost, started)
+
+        if len(self._waiters) >= self.queue_limit:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Server is busy ({len(self._waiters)} requests waiting)", self.retry_after()
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (cost, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self.timed_out += 1
+            raise AdmissionRejected(
+                f"Timed out after {self.timeout:g}s waiting for a conversion slot", self.retry_after()
+            )
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+        return self._admit(cost, started, reserved=True)
+
+    def _admit(self, cost: int, started: float, reserved: bool = False) -> Permit:
+        if not reserved:
+            self.in_use += cost
+        self.in_flight += 1
+        self.admitted += 1
+        now = time.monotonic()
+        wait = now - started
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self._recent_waits.append((now, wait))
+        return Permit(self, cost)
+
+    def _abandon(self, entry):
+        cost, waiter = entry
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+        elif waiter.done() and not waiter.cancelled():
+            # Budget was already handed to us; give it back
+            self.in_use -= cost
+            self._wake()
+
+    def _release(self, permit: Permit):
+        self.in_use -= permit.cost
+        self.in_flight -= 1
+        if permit.cost:
+            held = (time.monotonic() - permit.admitted_at) / permit.cost
+            self._hold_per_unit = 0.8 * self._hold_per_unit + 0.2 * held
+        self._wake()
+
+    def _wake(self):
+        # Strict FIFO: a large request at the head is not starved by small ones behind it
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.budget:
+            cost, waiter = self._waiters.popleft()
+            self.in_use += cost
+            waiter.set_result(None)
+
+    def demand(self) -> int:
+        """Budget in use plus budget requested by waiting requests."""
+        return self.in_use + sum(cost for cost, _ in self._waiters)
+
+    def wait_p95(self, window: float = 60.0) -> float:
+        """95th percentile admission wait (seconds) over the last window seconds."""
+        cutoff = time.monotonic() - window
+        waits = sorted(wait for admitted_at, wait in self._recent_waits if admitted_at >= cutoff)
+        if not waits:
+            return 0.0
+        return waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        return max(1, round(self.demand() * self._hold_per_unit / self.budget))
+
+    def stats(self) -> dict:
+        admitted = self.admitted
+        return {
+            "budget": self.budget,
+            "in_use": self.in_use,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "queue_limit": self.queue_limit,
+            "admitted": admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.wait_total / admitted * 1000, 2) if admitted else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "p95_wait_ms": round(self.wait_p95() * 1000, 2),
+            "retry_after": self.retry_after(),
+        }
+
+
+async def admit_tool(tool_name: str, args: dict) -> Permit:
+    """Admit an MCP tool call; joining a conversion that is already running is free."""
+    if get_flights().in_flight(tool_flight_key(tool_name, args)):
+        return await get_admission().acquire(0)
+    return await get_admission().acquire(tool_cost(tool_name, args))
+
+
+async def release_after(permit: Permit, stream):
+    """Pass an async iterator through, releasing permit when it ends."""
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        permit.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse holding permit until the stream ends or the response is over.
+
+    The stream's own finally only runs if the stream was started; a client
+    that is gone before the first chunk is sent would otherwise keep the
+    permit for good.
+    """
+
+    def __init__(self, permit: Permit, content, **kwargs):
+        super().__init__(release_after(permit, content), **kwargs)
+        self.permit = permit
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.permit.release()
+
+
+_admission = None
+
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller."""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Batch Engine
+
+Bounded process pool behind convert_batch. Each worker process owns its own
+MarkItDown instance and converts one file at a time; a worker that exceeds the
+per-file timeout is killed and replaced so one hung document cannot stall a batch.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from conversion_metrics import track_conversion
+from cpu_limits import usable_cpus
+
+# Each worker is a whole interpreter holding its own MarkItDown, so the default
+# is capped well below what a large node reports
+MAX_DEFAULT_BATCH_WORKERS = 4
+
+# Configuration
+BATCH_WORKERS = int(os.environ.get("MARKITDOWN_BATCH_WORKERS", str(min(usable_cpus(), MAX_DEFAULT_BATCH_WORKERS))))
+BATCH_TIMEOUT = float(os.environ.get("MARKITDOWN_BATCH_TIMEOUT", "120"))
+BATCH_STARTUP_TIMEOUT = float(os.environ.get("MARKITDOWN_BATCH_STARTUP_TIMEOUT", "60"))
+
+# Worker processes are spawned rather than forked: the servers run threads
+# (uvicorn, watchdog) that must not be duplicated into the children.
+_mp = multiprocessing.get_context("spawn")
+
+
+def _worker_main(conn):
+    """Worker process loop: announce readiness, then receive a path and send back a result dict."""
+    from markitdown import MarkItDown
+    from conversion_cache import convert_cached
+
+    md = MarkItDown()
+    conn.send("ready")
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            break
+        if path is None:
+            break
+        try:
+            result = convert_cached(md, path)
+            conn.send({
+                "success": True,
+                "markdown": result.text_content,
+                "title": getattr(result, "title", None),
+            })
+        except BaseException as e:  # markitdown raises BaseException subclasses
+            conn.send({"success": False, "error": str(e) or type(e).__name__, "error_type": type(e).__name__})
+
+
+class _Worker:
+    """A single conversion process and the pipe used to talk to it."""
+
+    def __init__(self):
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float):
+        """Block until the worker has imported MarkItDown, so startup is not billed to the first file."""
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Worker did not start within {timeout:g}s")
+        self.conn.recv()
+        self.ready = True
+
+    def convert(self, path: str, timeout: float) -> dict:
+        self.wait_ready(BATCH_STARTUP_TIMEOUT)
+        self.conn.send(path)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Conversion timed out after {timeout:g}s")
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class BatchEngine:
+    """Process pool that converts file batches in parallel, preserving input order."""
+
+    def __init__(self, workers: int = BATCH_WORKERS, timeout: float = BATCH_TIMEOUT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> _Worker:
+        # Start workers lazily, up to the configured bound
+        with self._lock:
+            if self._idle.empty() and self._started < self.workers:
+                self._started += 1
+                return _Worker()
+        return self._idle.get()
+
+    def _release(self, worker: _Worker | None):
+        if worker is None:
+            # Replacement is started lazily on the next acquire
+            with self._lock:
+                self._started -= 1
+        else:
+            self._idle.put(worker)
+
+    def _convert_one(self, path: str) -> dict:
+        if not os.path.exists(path):
+            return {"success": False, "path": path, "error": "File not found"}
+
+        with track_conversion("convert_batch", path) as record:
+            worker = self._acquire()
+            try:
+                result = worker.convert(path, self.timeout)
+            except TimeoutError as e:
+                worker.kill()
+                worker = None
+                result = {"success": False, "error": str(e), "error_type": "TimeoutError"}
+            except (EOFError, OSError) as e:
+                # Worker died mid-conversion (e.g. OOM-killed)
+                worker.kill()
+                worker = None
+                result = {"success": False, "error": f"Worker process failed: {e or 'exited'}", "error_type": "WorkerDied"}
+            finally:
+                self._release(worker)
+
+            if result["success"]:
+                record.markdown = result["markdown"]
+            else:
+                record.error = result.pop("error_type", "ConversionError")
+
+        result["path"] = path
+        return result
+
+    def convert_batch(self, paths: list[str]) -> list[dict]:
+        """Convert paths in parallel; results are returned in input order."""
+        if not paths:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+            return list(pool.map(self._convert_one, paths))
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._started = 0
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> BatchEngine:
+    """Return the process-wide batch engine."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = BatchEngine()
+        return _engine
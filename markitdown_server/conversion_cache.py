@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Conversion Cache
+
+Content-addressed cache for document conversions shared by every server entry point.
+Entries are keyed by the SHA-256 of the input bytes, the file extension and the
+MarkItDown version, kept in a small in-memory hot tier and persisted to disk.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+from pathlib import Path
+
+# Configuration
+CACHE_DIR = Path(os.environ.get("MARKITDOWN_CACHE_DIR", Path(tempfile.gettempdir()) / "markitdown-cache"))
+CACHE_MAX_BYTES = int(os.environ.get("MARKITDOWN_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_MAX_AGE = int(os.environ.get("MARKITDOWN_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+CACHE_HOT_ENTRIES = int(os.environ.get("MARKITDOWN_CACHE_HOT_ENTRIES", "128"))
+CACHE_ENABLED = os.environ.get("MARKITDOWN_CACHE", "1") == "1"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+try:
+    CONVERTER_VERSION = metadata.version("markitdown")
+except metadata.PackageNotFoundError:
+    CONVERTER_VERSION = "unknown"
+
+
+class CachedResult:
+    """Conversion result served from the cache; mirrors DocumentConverterResult."""
+
+    def __init__(self, text_content: str, title: str | None = None):
+        self.text_content = text_content
+        self.title = title
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://", "file://"))
+
+
+class ConversionCache:
+    """Two-tier (memory + disk) LRU cache of conversion results."""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 max_age: int = CACHE_MAX_AGE, hot_entries: int = CACHE_HOT_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hot_entries = hot_entries
+        self._hot = OrderedDict()
+        self._index = OrderedDict()  # key -> (size, last_access), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.hot_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def key(self, digest: str, extension: str = "") -> str:
+        """Build a cache key from a content digest and the source file extension."""
+        raw = f"{digest}:{extension.lower()}:{CONVERTER_VERSION}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path.stem, st.st_size))
+        for mtime, key, size in sorted(entries):
+            self._index[key] = (size, mtime)
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> CachedResult | None:
+        """Look up a conversion result; returns None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None and key in self._index:
+                self._hot.move_to_end(key)
+                self._touch(key, now)
+                self.hits += 1
+                self.hot_hits += 1
+                return CachedResult(entry["text_content"], entry.get("title"))
+
+            meta = self._index.get(key)
+            if meta is not None and now - meta[1] > self.max_age:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+        path = self._entry_path(key)
+        if meta is None:
+            # Not in this process's index, but another process sharing the
+            # directory (a batch worker, another server) may have written it
+            try:
+                st = path.stat()
+            except OSError:
+                with self._lock:
+                    self.misses += 1
+                return None
+            meta = (st.st_size, st.st_mtime)
+            if now - meta[1] > self.max_age:
+                with self._lock:
+                    self._remove(key)
+                    self.misses += 1
+                return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            adopted = key not in self._index
+            if adopted:
+                self._index[key] = meta
+                self._bytes += meta[0]
+            self._remember(key, entry)
+            self._touch(key, now)
+            self.hits += 1
+            if adopted:
+                self._evict()
+        return CachedResult(entry["text_content"], entry.get("title"))
+
+    def put(self, key: str, result) -> None:
+        """Store a conversion result (anything with text_content/title)."""
+        entry = {
+            "text_content": result.text_content,
+            "title": getattr(result, "title", None),
+            "converter_version": CONVERTER_VERSION,
+        }
+        data = json.dumps(entry).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._index[key] = (len(data), time.time())
+            self._bytes += len(data)
+            self._remember(key, entry)
+            self._evict()
+
+    def _remember(self, key: str, entry: dict):
+        self._hot[key] = entry
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def _touch(self, key: str, now: float):
+        meta = self._index.pop(key, None)
+        if meta is None:
+            return
+        self._index[key] = (meta[0], now)
+        try:
+            os.utime(self._entry_path(key), (now, now))
+        except OSError:
+            pass
+
+    def _remove(self, key: str):
+        meta = self._index.pop(key, None)
+        if meta is not None:
+            self._bytes -= meta[0]
+        self._hot.pop(key, None)
+        try:
+            self._entry_path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        cutoff = time.time() - self.max_age
+        while self._index:
+            key, (_, last_access) = next(iter(self._index.items()))
+            if last_access >= cutoff and self._bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._index),
+                "hot_entries": len(self._hot),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "hot_hits": self.hot_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "converter_version": CONVERTER_VERSION,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ConversionCache | None:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ConversionCache()
+        return _cache
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+def convert_cached(converter, source: str, digest: str | None = None, extension: str | None = None):
+    """
+    Convert a local file through the cache.
+
+    URLs are passed straight to the converter since they have no stable input bytes.
+    Callers that already hashed the content (e.g. while spooling an upload) pass
+    its digest to skip re-reading the file.
+    """
+    cache = get_cache()
+    if cache is None or is_url(source):
+        return converter.convert(source)
+
+    if extension is None:
+        extension = Path(source).suffix
+    key = cache.key(digest or file_digest(source), extension)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    result = converter.convert(source)
+    cache.put(key, result)
+    return result
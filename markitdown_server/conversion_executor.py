@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Conversion Executor
+
+Bounded thread pool that runs blocking MarkItDown conversions off the asyncio
+event loop, so one slow document cannot stall /health or other SSE streams.
+Submissions beyond the pool size wait in a bounded queue; once that is full
+new work is rejected with ExecutorSaturated instead of piling up.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cpu_limits import usable_cpus
+
+# Configuration
+EXECUTOR_WORKERS = int(os.environ.get("MARKITDOWN_EXECUTOR_WORKERS", str(min(32, usable_cpus() + 4))))
+EXECUTOR_QUEUE_DEPTH = int(os.environ.get("MARKITDOWN_EXECUTOR_QUEUE", "64"))
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor queue is full."""
+
+
+class ConversionExecutor:
+    """Thread pool with a bounded backlog and basic timing metrics."""
+
+    def __init__(self, workers: int = EXECUTOR_WORKERS, queue_depth: int = EXECUTOR_QUEUE_DEPTH):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="markitdown")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        with self._lock:
+            if self.pending >= self.workers + self.queue_depth:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"Conversion queue is full ({self.pending} pending, limit {self.workers + self.queue_depth})"
+                )
+            self.pending += 1
+            self.submitted += 1
+
+        submitted_at = time.monotonic()
+
+        def call():
+            started_at = time.monotonic()
+            with self._lock:
+                self.running += 1
+                wait = started_at - submitted_at
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.run_total += time.monotonic() - started_at
+
+        future = self._pool.submit(call)
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future):
+        # Runs even if the awaiting request was cancelled, so counters stay accurate
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_total / finished * 1000, 2) if finished else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 2),
+                "avg_run_ms": round(self.run_total / finished * 1000, 2) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ConversionExecutor:
+    """Return the process-wide conversion executor."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ConversionExecutor()
+        return _executor
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Conversion Metrics
+
+Conversion latency per tool and format, bytes in and out, Markdown produced,
+in-flight conversions and error classes, plus scrape-time gauges for the
+cache, executor, admission controller and single-flight registry. Served by
+the HTTP servers at /metrics.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import Counter, Gauge, Histogram
+from conversion_cache import cache_stats
+from conversion_executor import get_executor
+from admission import get_admission
+from single_flight import get_flights
+
+# Configuration
+SATURATION_TARGET_WAIT = float(os.environ.get("MARKITDOWN_SATURATION_TARGET_WAIT", "1.0"))
+READY_MAX_SATURATION = float(os.environ.get("MARKITDOWN_READY_MAX_SATURATION", "1.0"))
+
+CONVERSION_SECONDS = Histogram(
+    "markitdown_conversion_seconds", "Conversion latency", ("tool", "format")
+)
+CONVERSIONS_IN_FLIGHT = Gauge(
+    "markitdown_conversions_in_flight", "Conversions currently running"
+)
+CONVERSION_ERRORS = Counter(
+    "markitdown_conversion_errors_total", "Failed conversions by error class", ("tool", "format", "error")
+)
+BYTES_IN = Counter(
+    "markitdown_input_bytes_total", "Bytes of source documents converted", ("format",)
+)
+BYTES_OUT = Counter(
+    "markitdown_output_bytes_total", "Bytes of Markdown produced (UTF-8)", ("format",)
+)
+MARKDOWN_CHARS = Counter(
+    "markitdown_markdown_chars_total", "Characters of Markdown produced", ("format",)
+)
+
+
+def _stat(stats, name: str):
+    return lambda: stats().get(name, 0)
+
+
+Counter("markitdown_cache_hits_total", "Conversion cache hits", fn=_stat(cache_stats, "hits"))
+Counter("markitdown_cache_misses_total", "Conversion cache misses", fn=_stat(cache_stats, "misses"))
+Gauge("markitdown_cache_hit_ratio", "Conversion cache hit ratio", fn=_stat(cache_stats, "hit_ratio"))
+Gauge("markitdown_cache_bytes", "Bytes stored in the conversion cache", fn=_stat(cache_stats, "bytes"))
+Gauge("markitdown_executor_running", "Conversions running on the executor",
+      fn=lambda: get_executor().stats()["running"])
+Gauge("markitdown_executor_queued", "Conversions waiting for an executor thread",
+      fn=lambda: get_executor().stats()["queued"])
+Counter("markitdown_executor_rejected_total", "Conversions rejected by the executor",
+        fn=lambda: get_executor().rejected)
+Gauge("markitdown_admission_in_use", "Admission budget currently in use",
+      fn=lambda: get_admission().in_use)
+Gauge("markitdown_admission_waiting", "Requests waiting for admission",
+      fn=lambda: get_admission().stats()["waiting"])
+Counter("markitdown_admission_rejected_total", "Requests rejected with 429",
+        fn=lambda: get_admission().rejected + get_admission().timed_out)
+Counter("markitdown_coalesced_total", "Requests that joined an in-flight conversion",
+        fn=lambda: get_flights().coalesced)
+
+
+def saturation() -> float:
+    """
+    Load relative to capacity: 1.0 means fully busy, above 1.0 work is queuing.
+
+    The largest of admission demand over budget, executor backlog over
+    threads, and the recent p95 admission wait over the target wait.
+    """
+    admission = get_admission()
+    executor = get_executor()
+    return round(max(
+        admission.demand() / admission.budget,
+        executor.pending / executor.workers,
+        admission.wait_p95() / SATURATION_TARGET_WAIT,
+    ), 3)
+
+
+Gauge("markitdown_saturation", "Load relative to capacity (1 = fully busy, >1 = queuing)", fn=saturation)
+Gauge("markitdown_admission_wait_p95_seconds", "p95 admission wait over the last minute",
+      fn=lambda: get_admission().wait_p95())
+
+_saturated = False
+
+
+def readiness() -> dict:
+    """
+    Readiness for the /ready endpoint; not ready while saturated.
+
+    Once not ready, the pod stays out until saturation drops below 80% of the
+    threshold so it does not flap in and out of the router.
+    """
+    global _saturated
+    level = saturation()
+    limit = READY_MAX_SATURATION * 0.8 if _saturated else READY_MAX_SATURATION
+    _saturated = level > limit
+    return {"ready": not _saturated, "saturation": level, "threshold": READY_MAX_SATURATION}
+
+
+def format_of(source: str | None) -> str:
+    """Format label for a path or URL."""
+    if not source:
+        return "unknown"
+    if source.startswith(("http://", "https://")):
+        return "url"
+    return Path(source).suffix.lower().lstrip(".") or "none"
+
+
+class ConversionRecord:
+    """Filled in by the caller of track_conversion."""
+
+    def __init__(self):
+        self.markdown = None
+        self.error = None
+
+
+@contextmanager
+def track_conversion(tool: str, source: str | None = None, bytes_in: int | None = None):
+    """
+    Time a conversion and count its input and output.
+
+    Set record.markdown to the result for the output counters, or
+    record.error to an error class for failures reported without raising.
+    """
+    fmt = format_of(source)
+    record = ConversionRecord()
+    CONVERSIONS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        CONVERSIONS_IN_FLIGHT.dec()
+        CONVERSION_SECONDS.observe(time.perf_counter() - started, tool=tool, format=fmt)
+        if record.error is not None:
+            CONVERSION_ERRORS.inc(tool=tool, format=fmt, error=record.error)
+        elif record.markdown is not None:
+            if bytes_in is None and fmt != "url":
+                try:
+                    bytes_in = os.path.getsize(source)
+                except (OSError, TypeError):
+                    bytes_in = None
+            if bytes_in is not None:
+                BYTES_IN.inc(bytes_in, format=fmt)
+            BYTES_OUT.inc(len(record.markdown.encode("utf-8")), format=fmt)
+            MARKDOWN_CHARS.inc(len(record.markdown), format=fmt)
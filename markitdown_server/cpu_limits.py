@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+CPU Limits
+
+How many CPUs this process can really use, for sizing worker pools. Inside a
+container os.cpu_count() reports the host's cores, so defaults derived from
+it oversubscribe a pod that has a CPU limit.
+"""
+
+import math
+import os
+
+
+def usable_cpus() -> int:
+    """CPUs this process may actually use: the affinity mask, bounded by a cgroup CPU quota.
+
+    os.cpu_count() reports the host's cores and ignores a container's CPU limit.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
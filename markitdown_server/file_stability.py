@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+MarkItDown File Stability Detection
+
+Decides when a file dropped into a watched directory has finished being
+written and hands it to a bounded pool of conversion workers. Watchdog
+callbacks only enqueue the path; a single settler thread owns all state.
+A file is ready once its writer closes it or once its size and mtime have
+stopped changing for the settle time, so a large copy is never converted
+half-written and a burst of drops converts in parallel instead of one
+after another. Where the platform reports close-write (inotify), a file
+seen being written is only taken on settling after the much longer
+open-settle time, for writers that pause mid-copy; files that only
+appeared (renamed in, or found in a new folder) settle as usual.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cpu_limits import usable_cpus
+
+# Configuration
+WATCH_WORKERS = int(os.environ.get("MARKITDOWN_WATCH_WORKERS", str(usable_cpus())))
+WATCH_QUEUE_DEPTH = int(os.environ.get("MARKITDOWN_WATCH_QUEUE", "64"))
+WATCH_SETTLE_SECONDS = float(os.environ.get("MARKITDOWN_WATCH_SETTLE", "1.0"))
+WATCH_OPEN_SETTLE_SECONDS = float(os.environ.get("MARKITDOWN_WATCH_OPEN_SETTLE", "30"))
+WATCH_POLL_INTERVAL = float(os.environ.get("MARKITDOWN_WATCH_POLL", "0.25"))
+
+
+EVENTS = ("created", "modified", "closed")
+
+
+class _Candidate:
+    __slots__ = ("signature", "stable_since", "closed", "writing")
+
+    def __init__(self):
+        self.signature = None
+        self.stable_since = 0.0
+        self.closed = False
+        self.writing = False
+
+
+class StabilityTracker:
+    """Settles file events and runs handle(path) for each settled file on a bounded pool.
+
+    close_events says whether the observer reports close-write; if it does, files
+    with writes since their last close wait open_settle_seconds instead.
+    """
+
+    def __init__(self, handle, workers: int = WATCH_WORKERS, queue_depth: int = WATCH_QUEUE_DEPTH,
+                 settle_seconds: float = WATCH_SETTLE_SECONDS, poll_interval: float = WATCH_POLL_INTERVAL,
+                 close_events: bool = False, open_settle_seconds: float = WATCH_OPEN_SETTLE_SECONDS):
+        self.handle = handle
+        self.workers = max(1, workers)
+        self.settle_seconds = settle_seconds
+        self.open_settle_seconds = max(settle_seconds, open_settle_seconds) if close_events else settle_seconds
+        self.poll_interval = max(0.01, poll_interval)
+        self._events = queue.SimpleQueue()
+        self._pending = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        # Settled files beyond workers + queue_depth stay pending until a slot frees up
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_depth))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watcher")
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="watcher-settle", daemon=True)
+        self.converted = 0
+        self.failed = 0
+
+    def notify(self, path: Path, event: str = "modified"):
+        """Record an event (one of EVENTS) for path; safe and cheap to call from the observer thread."""
+        self._events.put((path, event))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop settling; conversions already running finish, queued ones are dropped."""
+        self._stopping.set()
+        self._events.put(None)
+        self._thread.join()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                item = self._events.get(timeout=self.poll_interval if self._pending else None)
+            except queue.Empty:
+                item = None
+            now = time.monotonic()
+            # Take the whole backlog at once: a burst of events costs one pass
+            while item is not None:
+                self._record(*item, now)
+                try:
+                    item = self._events.get_nowait()
+                except queue.Empty:
+                    item = None
+            self._settle(now)
+
+    def _record(self, path: Path, event: str, now: float):
+        with self._lock:
+            if path in self._in_flight:
+                return
+        candidate = self._pending.get(path)
+        if candidate is None:
+            candidate = self._pending[path] = _Candidate()
+        candidate.closed = event == "closed"
+        if event != "created":
+            candidate.writing = event == "modified"
+        candidate.stable_since = now
+
+    def _settle(self, now: float):
+        for path, candidate in list(self._pending.items()):
+            try:
+                st = path.stat()
+            except OSError:
+                # Deleted or moved away before it settled
+                del self._pending[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if signature != candidate.signature:
+                if candidate.signature is not None:
+                    candidate.closed = False
+                candidate.signature = signature
+                candidate.stable_since = now
+                if not candidate.closed:
+                    continue
+            if not candidate.closed:
+                # An empty file may just have been opened; treat it as still being written
+                writing = candidate.writing or not st.st_size
+                if now - candidate.stable_since < (self.open_settle_seconds if writing else self.settle_seconds):
+                    continue
+            if not self._slots.acquire(blocking=False):
+                return
+            del self._pending[path]
+            with self._lock:
+                self._in_flight.add(path)
+            self._pool.submit(self._convert, path)
+
+    def _convert(self, path: Path):
+        try:
+            self.handle(path)
+            ok = True
+        except BaseException as e:  # markitdown raises BaseException subclasses
+            print(f"❌ Error converting {path.name}: {str(e) or type(e).__name__}\n")
+            ok = False
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+            self._slots.release()
+        with self._lock:
+            if ok:
+                self.converted += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "converted": self.converted,
+                "failed": self.failed,
+            }
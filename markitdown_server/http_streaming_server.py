@@ -4,16 +4,25 @@ MarkItDown Unified HTTP Server
 Single server with MCP tools API, Web UI, and streaming support.
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastmcp import FastMCP
 from markitdown import MarkItDown
+from conversion_cache import convert_cached, cache_stats
+from batch_engine import get_engine
+from conversion_executor import get_executor, ExecutorSaturated
+from progressive import stream_units, stream_upload_units, ConversionSummary
+from single_flight import get_flights, tool_flight_key, upload_flight_key
+from upload_spool import spool_upload, SpooledUpload, UploadTooLarge
+from job_queue import JobQueue, JobQueueFull
+from admission import get_admission, admit_tool, cost_for, AdmittedStreamingResponse, AdmissionRejected
+from conversion_metrics import track_conversion, readiness
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import uvicorn
 import json
 import asyncio
 from pathlib import Path
-import tempfile
 import os
 from datetime import datetime
 
@@ -27,34 +36,34 @@ SUPPORTED_FORMATS = [
     "json", "xml", "jpg", "jpeg", "png", "gif", "wav"
 ]
 
+TOOL_NAMES = {"convert_file", "convert_url", "convert_batch", "get_supported_formats"}
+
 # MCP Tools
 @mcp.tool()
 def convert_file(path: str) -> str:
     """Convert a local file to Markdown format."""
     if not os.path.exists(path):
         raise FileNotFoundError(f"File not found: {path}")
-    result = markitdown.convert(path)
-    return result.text_content
+    with track_conversion("convert_file", path) as record:
+        record.markdown = convert_cached(markitdown, path).text_content
+    return record.markdown
 
 @mcp.tool()
 def convert_url(url: str) -> str:
     """Convert a web page to Markdown format."""
-    result = markitdown.convert(url)
-    return result.text_content
+    with track_conversion("convert_url", url) as record:
+        record.markdown = markitdown.convert(url).text_content
+    return record.markdown
 
 @mcp.tool()
 def convert_batch(paths: list[str]) -> dict:
     """Convert multiple files to Markdown format."""
     results = {}
-    for path in paths:
-        try:
-            if os.path.exists(path):
-                result = markitdown.convert(path)
-                results[path] = result.text_content
-            else:
-                results[path] = f"Error: File not found"
-        except Exception as e:
-            results[path] = f"Error: {str(e)}"
+    for item in get_engine().convert_batch(paths):
+        if item["success"]:
+            results[item["path"]] = item["markdown"]
+        else:
+            results[item["path"]] = f"Error: {item['error']}"
     return results
 
 @mcp.tool()
@@ -62,6 +71,18 @@ def get_supported_formats() -> list[str]:
     """Get list of supported file formats."""
     return SUPPORTED_FORMATS
 
+def run_tool(tool_name: str, args: dict):
+    """Run an MCP tool by name (blocking; call through the conversion executor)."""
+    if tool_name == "convert_file":
+        return convert_file.fn(args.get("path"))
+    elif tool_name == "convert_url":
+        return convert_url.fn(args.get("url"))
+    elif tool_name == "convert_batch":
+        return convert_batch.fn(args.get("paths"))
+    elif tool_name == "get_supported_formats":
+        return get_supported_formats.fn()
+    raise ValueError(f"Unknown tool: {tool_name}")
+
 # FastAPI app
 app = FastAPI(
     title="MarkItDown HTTP Streaming Server",
@@ -77,53 +98,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Durable queue for long conversions (/jobs). Built in the startup hook, not at
+# import: batch_engine's spawned workers re-import this module as __mp_main__
+job_queue: JobQueue | None = None
+
+@app.on_event("startup")
+async def start_job_workers():
+    global job_queue
+    job_queue = JobQueue(markitdown, run_tool)
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    if job_queue is not None:
+        await job_queue.stop()
+
 # Streaming helper
-async def stream_conversion(file_path: str, filename: str):
+async def stream_conversion(upload: SpooledUpload):
     """Stream conversion progress and result"""
+    leader = False
+    
+    def start_conversion():
+        nonlocal leader
+        leader = True
+        return stream_upload_units(markitdown, upload)
+    
     try:
-        yield f"data: {json.dumps({'type': 'start', 'filename': filename, 'timestamp': datetime.now().isoformat()})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Reading file...', 'percent': 30})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Converting to Markdown...', 'percent': 60})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        result = markitdown.convert(file_path)
+        yield f"data: {json.dumps({'type': 'start', 'filename': upload.filename, 'size': upload.size, 'timestamp': datetime.now().isoformat()})}\n\n"
         
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Finalizing...', 'percent': 90})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        yield f"data: {json.dumps({'type': 'complete', 'content': result.text_content, 'percent': 100})}\n\n"
+        # Identical uploads in flight share one conversion
+        key = upload_flight_key(upload.digest, Path(upload.path).suffix)
+        async for unit in get_flights().stream(key, start_conversion):
+            if isinstance(unit, ConversionSummary):
+                yield f"data: {json.dumps({'type': 'complete', 'content': unit.markdown, 'percent': 100, 'units': unit.units, 'ttfb_ms': unit.ttfb_ms, 'elapsed_ms': unit.elapsed_ms})}\n\n"
+            else:
+                if unit.percent is not None:
+                    yield f"data: {json.dumps({'type': 'progress', 'message': f'Converted {unit.kind} {unit.index}/{unit.total}', 'percent': unit.percent})}\n\n"
+                yield f"data: {json.dumps({'type': 'chunk', 'unit': unit.kind, 'index': unit.index, 'total': unit.total, 'content': unit.markdown})}\n\n"
         
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
     finally:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
+        # A coalesced request never converts its own copy; the leader's copy is removed by stream_upload_units
+        if not leader:
+            upload.cleanup()
 
 async def stream_tool_execution(tool_name: str, args: dict):
     """Stream MCP tool execution"""
     try:
         yield f"data: {json.dumps({'type': 'start', 'tool': tool_name, 'timestamp': datetime.now().isoformat()})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        yield f"data: {json.dumps({'type': 'progress', 'message': f'Executing {tool_name}...', 'percent': 50})}\n\n"
-        await asyncio.sleep(0.1)
         
         if tool_name == "convert_file":
-            result = convert_file(args.get("path"))
-        elif tool_name == "convert_url":
-            result = convert_url(args.get("url"))
-        elif tool_name == "convert_batch":
-            result = convert_batch(args.get("paths"))
-        elif tool_name == "get_supported_formats":
-            result = get_supported_formats()
+            path = args.get("path")
+            if not path or not os.path.exists(path):
+                raise FileNotFoundError(f"File not found: {path}")
+            key = tool_flight_key(tool_name, args)
+            async for unit in get_flights().stream(key, lambda: stream_units(markitdown, path, tool=tool_name)):
+                if isinstance(unit, ConversionSummary):
+                    yield f"data: {json.dumps({'type': 'complete', 'result': unit.markdown, 'percent': 100, 'units': unit.units, 'ttfb_ms': unit.ttfb_ms, 'elapsed_ms': unit.elapsed_ms})}\n\n"
+                else:
+                    if unit.percent is not None:
+                        yield f"data: {json.dumps({'type': 'progress', 'message': f'Converted {unit.kind} {unit.index}/{unit.total}', 'percent': unit.percent})}\n\n"
+                    yield f"data: {json.dumps({'type': 'chunk', 'unit': unit.kind, 'index': unit.index, 'total': unit.total, 'content': unit.markdown})}\n\n"
         else:
-            raise ValueError(f"Unknown tool: {tool_name}")
-        
-        yield f"data: {json.dumps({'type': 'complete', 'result': result, 'percent': 100})}\n\n"
+            result = await get_executor().run(run_tool, tool_name, args)
+            yield f"data: {json.dumps({'type': 'complete', 'result': result, 'percent': 100})}\n\n"
         
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
@@ -497,6 +536,8 @@ curl http://localhost:8080/api/formats
         
         async function handleFile(file) {
             currentFilename = file.name;
+            convertedContent = '';
+            resultContent.textContent = '';
             uploadArea.style.display = 'none';
             progressContainer.style.display = 'block';
             resultContainer.style.display = 'none';
@@ -512,13 +553,16 @@ curl http://localhost:8080/api/formats
                 
                 const reader = response.body.getReader();
                 const decoder = new TextDecoder();
+                let buffer = '';
                 
                 while (true) {
                     const { done, value } = await reader.read();
                     if (done) break;
                     
-                    const chunk = decoder.decode(value);
-                    const lines = chunk.split('\\n\\n');
+                    // Events can span reads once partial content is streamed
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\\n\\n');
+                    buffer = lines.pop();
                     
                     for (const line of lines) {
                         if (line.startsWith('data: ')) {
@@ -542,6 +586,13 @@ curl http://localhost:8080/api/formats
                     progressBar.textContent = `${data.percent}%`;
                     statusText.textContent = data.message;
                     break;
+                case 'chunk':
+                    // Show partial Markdown as each page/sheet/slide arrives
+                    convertedContent += data.content;
+                    resultContainer.style.display = 'block';
+                    resultContent.textContent = convertedContent;
+                    break;
+                    
                 case 'complete':
                     progressBar.style.width = '100%';
                     progressBar.textContent = '100%';
@@ -607,49 +658,144 @@ async def get_formats():
 @app.post("/api/call/{tool_name}")
 async def call_tool(tool_name: str, args: dict):
     """Call MCP tool (JSON response)"""
+    if tool_name not in TOOL_NAMES:
+        raise HTTPException(status_code=404, detail=f"Tool not found: {tool_name}")
     try:
-        if tool_name == "convert_file":
-            result = convert_file(args.get("path"))
-        elif tool_name == "convert_url":
-            result = convert_url(args.get("url"))
-        elif tool_name == "convert_batch":
-            result = convert_batch(args.get("paths"))
-        elif tool_name == "get_supported_formats":
-            result = get_supported_formats()
-        else:
-            raise HTTPException(status_code=404, detail=f"Tool not found: {tool_name}")
+        permit = await admit_tool(tool_name, args)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        result = await get_flights().do(
+            tool_flight_key(tool_name, args),
+            lambda: get_executor().run(run_tool, tool_name, args)
+        )
         return {"success": True, "result": result}
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        permit.release()
+
+# Registered before /api/stream/{tool_name} so "convert" is not taken as a tool name
+@app.post("/api/stream/convert")
+async def convert_upload(file: UploadFile = File(...)):
+    """Upload and convert with streaming"""
+    # FastAPI has already received the body to parse File(...); admitting first
+    # keeps an overloaded server from spooling and converting it
+    try:
+        permit = await get_admission().acquire(cost_for(Path(file.filename or "").suffix))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        permit.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        permit.release()
+        raise
+    
+    return AdmittedStreamingResponse(
+        permit, stream_conversion(upload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/stream/{tool_name}")
 async def stream_tool(tool_name: str, args: dict):
     """Call MCP tool with streaming (SSE)"""
-    return StreamingResponse(
-        stream_tool_execution(tool_name, args),
+    try:
+        permit = await admit_tool(tool_name, args)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return AdmittedStreamingResponse(
+        permit, stream_tool_execution(tool_name, args),
         media_type="text/event-stream",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-@app.post("/api/stream/convert")
-async def convert_upload(file: UploadFile = File(...)):
-    """Upload and convert with streaming"""
-    suffix = Path(file.filename).suffix
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+# Asynchronous jobs
+@app.post("/jobs", status_code=202)
+async def submit_upload_job(file: UploadFile = File(...), priority: int = Form(0)):
+    """Upload a file and queue its conversion; higher priority runs first"""
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        return job_queue.submit_upload(upload, priority)
+    except JobQueueFull as e:
+        upload.cleanup()
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/jobs/tools/{tool_name}", status_code=202)
+async def submit_tool_job(tool_name: str, args: dict, priority: int = 0):
+    """Queue an MCP tool call"""
+    if tool_name not in TOOL_NAMES:
+        raise HTTPException(status_code=404, detail=f"Tool not found: {tool_name}")
+    try:
+        return job_queue.submit_tool(tool_name, args, priority)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Job status and progress"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Result of a finished job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}" + (f": {job['error']}" if job["error"] else ""))
+    return {"job_id": job_id, "status": job["status"], "result": job_queue.result(job_id)}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Job status updates (SSE) until the job finishes"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    
+    async def stream_job_events():
+        async for job in job_queue.watch(job_id):
+            yield f"data: {json.dumps({'type': 'status', **job})}\n\n"
     
     return StreamingResponse(
-        stream_conversion(tmp_path, file.filename),
+        stream_job_events(),
         media_type="text/event-stream",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 while saturated so the router stops sending new work"""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/health")
 async def health():
     """Health check"""
-    return {"status": "healthy", "streaming": "enabled", "mcp_tools": 4}
+    return {"status": "healthy", "streaming": "enabled", "mcp_tools": 4, "cache": cache_stats(), "executor": get_executor().stats(), "coalescing": get_flights().stats(), "admission": get_admission().stats(), "jobs": job_queue.stats()}
 
 if __name__ == "__main__":
     print("🚀 Starting MarkItDown HTTP Streaming Server...")
@@ -660,6 +806,7 @@ if __name__ == "__main__":
     print("   • MCP tools accessible via HTTP API")
     print("   • Real-time streaming progress (SSE)")
     print("   • 4 MCP tools: convert_file, convert_url, convert_batch, get_supported_formats")
+    print("   • Background jobs: POST /jobs, GET /jobs/{id}, /jobs/{id}/result, /jobs/{id}/events")
     print("\nPress Ctrl+C to stop")
     
     uvicorn.run(app, host="0.0.0.0", port=8080, log_level="info")
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Job Queue
+
+Durable queue for long conversions that should not be tied to one HTTP
+request. Jobs live in a local SQLite database together with their spooled
+input files, are claimed highest-priority first by a fixed number of asyncio
+workers, and survive a restart: anything that was running is put back in the
+queue when the server starts again.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from admission import get_admission, cost_for, tool_cost, AdmissionRejected
+from conversion_executor import get_executor, ExecutorSaturated
+from progressive import stream_units, ConversionSummary
+
+# Configuration
+JOBS_DIR = os.environ.get("MARKITDOWN_JOBS_DIR", os.path.join(tempfile.gettempdir(), "markitdown-jobs"))
+JOB_WORKERS = int(os.environ.get("MARKITDOWN_JOB_WORKERS", "2"))
+JOBS_MAX_QUEUED = int(os.environ.get("MARKITDOWN_JOBS_MAX_QUEUED", "10000"))
+JOB_RETENTION = int(os.environ.get("MARKITDOWN_JOB_RETENTION", str(24 * 60 * 60)))
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    tool TEXT,
+    args TEXT,
+    filename TEXT,
+    input_path TEXT,
+    digest TEXT,
+    percent INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    units INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created_at);
+"""
+
+_STATUS_COLUMNS = "id, status, priority, tool, filename, percent, message, units, error, created_at, started_at, finished_at"
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting."""
+
+
+class JobQueue:
+    """SQLite-backed priority queue drained by asyncio workers."""
+
+    def __init__(self, converter, run_tool, directory: str = JOBS_DIR, workers: int = JOB_WORKERS,
+                 max_queued: int = JOBS_MAX_QUEUED):
+        self.converter = converter
+        self.run_tool = run_tool
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.input_dir = os.path.join(directory, "inputs")
+        os.makedirs(self.input_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "jobs.sqlite3"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+        self._tasks = []
+        self._wakeup = None
+        self._changed = None
+        self._cancelled = set()
+
+    # Submission
+
+    def submit_upload(self, upload, priority: int = 0) -> dict:
+        """Queue a SpooledUpload for conversion; the queue takes ownership of its file."""
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.input_dir, job_id + os.path.splitext(upload.path)[1])
+        self._check_capacity()
+        shutil.move(upload.path, input_path)
+        try:
+            self._insert(job_id, priority, filename=upload.filename, input_path=input_path, digest=upload.digest)
+        except BaseException:
+            os.unlink(input_path)
+            raise
+        return self.get(job_id)
+
+    def submit_tool(self, tool_name: str, args: dict, priority: int = 0) -> dict:
+        """Queue an MCP tool call."""
+        job_id = uuid.uuid4().hex
+        self._check_capacity()
+        self._insert(job_id, priority, tool=tool_name, args=json.dumps(args))
+        return self.get(job_id)
+
+    def _check_capacity(self):
+        with self._lock:
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= self.max_queued:
+            raise JobQueueFull(f"Job queue is full ({queued} queued, limit {self.max_queued})")
+
+    def _insert(self, job_id: str, priority: int, **fields):
+        fields.update(id=job_id, status="queued", priority=priority, created_at=time.time())
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        with self._lock, self._db:
+            self._db.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", tuple(fields.values()))
+        self._notify()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # Inspection
+
+    def get(self, job_id: str) -> dict | None:
+        """Job status without the result body, or None for unknown jobs."""
+        with self._lock:
+            row = self._db.execute(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def result(self, job_id: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["result"]) if row is not None and row["result"] is not None else None
+
+    async def watch(self, job_id: str):
+        """Yield the job status every time it changes, until it finishes."""
+        last = None
+        while True:
+            changed = self._changed
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job != last:
+                yield job
+                last = job
+            if job["status"] in FINISHED_STATES:
+                return
+            await changed.wait()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "workers": self.workers,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "cancelled": counts.get("cancelled", 0),
+        }
+
+    # Cancellation
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Cancel a job; queued jobs stop immediately, running ones at the next unit boundary."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT status, input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "queued":
+                self._db.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+                self._remove_input(row["input_path"])
+            elif row["status"] == "running":
+                self._cancelled.add(job_id)
+        self._notify()
+        return self.get(job_id)
+
+    # Workers
+
+    def start(self):
+        """Start the workers on the running event loop."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        # Work interrupted by a restart goes back to the queue. This runs only
+        # here, in the serving process: spawned helper processes re-import the
+        # server module and must not requeue jobs that are still running.
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        self._purge()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify(self):
+        if self._changed is not None:
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    def _claim(self) -> dict | None:
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"])
+            )
+        self._notify()
+        return dict(row)
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        self._notify()
+
+    async def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    self._purge()
+                continue
+
+            try:
+                result = await self._run(job)
+            except (ExecutorSaturated, AdmissionRejected):
+                # Leave the job for later rather than failing it
+                self._update(job["id"], status="queued", started_at=None)
+                await asyncio.sleep(1)
+                continue
+            except Exception as e:
+                self._finish(job, status="failed", error=str(e))
+                continue
+
+            if job["id"] in self._cancelled:
+                self._finish(job, status="cancelled")
+            else:
+                self._finish(job, status="done", percent=100, result=json.dumps(result))
+
+    async def _run(self, job: dict):
+        # Jobs share the admission budget with interactive requests
+        if job["tool"] is not None:
+            args = json.loads(job["args"])
+            permit = await get_admission().acquire(tool_cost(job["tool"], args))
+        else:
+            permit = await get_admission().acquire(cost_for(os.path.splitext(job["input_path"])[1]))
+        try:
+            if job["tool"] is not None:
+                return await get_executor().run(self.run_tool, job["tool"], args)
+            return await self._convert(job)
+        finally:
+            permit.release()
+
+    async def _convert(self, job: dict):
+
+        units = stream_units(self.converter, job["input_path"], job["digest"], tool="job")
+        try:
+            async for unit in units:
+                if job["id"] in self._cancelled:
+                    return None
+                if isinstance(unit, ConversionSummary):
+                    self._update(job["id"], units=unit.units)
+                    return unit.markdown
+                if unit.percent is not None:
+                    self._update(
+                        job["id"], percent=unit.percent,
+                        message=f"Converted {unit.kind} {unit.index}/{unit.total}"
+                    )
+        finally:
+            # Stops the conversion thread when the job is cancelled
+            await units.aclose()
+
+    def _finish(self, job: dict, **fields):
+        self._cancelled.discard(job["id"])
+        self._update(job["id"], finished_at=time.time(), **fields)
+        self._remove_input(job["input_path"])
+
+    def _remove_input(self, input_path: str | None):
+        if input_path and os.path.exists(input_path):
+            os.unlink(input_path)
+
+    def _purge(self):
+        """Delete finished jobs older than the retention period."""
+        with self._lock, self._db:
+            self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATES)}) AND finished_at < ?",
+                (*FINISHED_STATES, time.time() - JOB_RETENTION)
+            )
@@ -5,15 +5,23 @@ Exposes MCP tools via HTTP/SSE instead of STDIO for streaming responses.
 """
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastmcp import FastMCP
 from markitdown import MarkItDown
+from conversion_cache import convert_cached, cache_stats
+from batch_engine import get_engine
+from conversion_executor import get_executor, ExecutorSaturated
+from progressive import stream_units, stream_upload_units, ConversionSummary
+from single_flight import get_flights, tool_flight_key, upload_flight_key
+from upload_spool import spool_upload, UploadTooLarge
+from admission import get_admission, admit_tool, cost_for, AdmittedStreamingResponse, AdmissionRejected
+from conversion_metrics import track_conversion, readiness
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import uvicorn
 import json
 import asyncio
 from pathlib import Path
-import tempfile
 import os
 from datetime import datetime
 
@@ -28,6 +36,8 @@ SUPPORTED_FORMATS = [
     "json", "xml", "jpg", "jpeg", "png", "gif", "wav"
 ]
 
+TOOL_NAMES = {"convert_file", "convert_url", "convert_batch", "get_supported_formats"}
+
 
 @mcp.tool()
 def convert_file(path: str) -> str:
@@ -43,8 +53,9 @@ def convert_file(path: str) -> str:
     if not os.path.exists(path):
         raise FileNotFoundError(f"File not found: {path}")
     
-    result = markitdown.convert(path)
-    return result.text_content
+    with track_conversion("convert_file", path) as record:
+        record.markdown = convert_cached(markitdown, path).text_content
+    return record.markdown
 
 
 @mcp.tool()
@@ -58,8 +69,9 @@ def convert_url(url: str) -> str:
     Returns:
         Markdown content as string
     """
-    result = markitdown.convert(url)
-    return result.text_content
+    with track_conversion("convert_url", url) as record:
+        record.markdown = markitdown.convert(url).text_content
+    return record.markdown
 
 
 @mcp.tool()
@@ -74,15 +86,11 @@ def convert_batch(paths: list[str]) -> dict:
         Dictionary mapping paths to their markdown content
     """
     results = {}
-    for path in paths:
-        try:
-            if os.path.exists(path):
-                result = markitdown.convert(path)
-                results[path] = result.text_content
-            else:
-                results[path] = f"Error: File not found"
-        except Exception as e:
-            results[path] = f"Error: {str(e)}"
+    for item in get_engine().convert_batch(paths):
+        if item["success"]:
+            results[item["path"]] = item["markdown"]
+        else:
+            results[item["path"]] = f"Error: {item['error']}"
     
     return results
 
@@ -98,6 +106,19 @@ def get_supported_formats() -> list[str]:
     return SUPPORTED_FORMATS
 
 
+def run_tool(tool_name: str, args: dict):
+    """Run an MCP tool by name (blocking; call through the conversion executor)."""
+    if tool_name == "convert_file":
+        return convert_file.fn(args.get("path"))
+    elif tool_name == "convert_url":
+        return convert_url.fn(args.get("url"))
+    elif tool_name == "convert_batch":
+        return convert_batch.fn(args.get("paths"))
+    elif tool_name == "get_supported_formats":
+        return get_supported_formats.fn()
+    raise ValueError(f"Unknown tool: {tool_name}")
+
+
 # Create FastAPI app for HTTP transport
 app = FastAPI(
     title="MarkItDown MCP HTTP Server",
@@ -119,29 +140,24 @@ async def stream_tool_execution(tool_name: str, args: dict):
     try:
         # Send start event
         yield f"data: {json.dumps({'type': 'start', 'tool': tool_name, 'timestamp': datetime.now().isoformat()})}\n\n"
-        await asyncio.sleep(0.1)
         
-        # Send progress
-        yield f"data: {json.dumps({'type': 'progress', 'message': f'Executing {tool_name}...', 'percent': 30})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        # Execute the MCP tool
         if tool_name == "convert_file":
-            result = convert_file(args.get("path"))
-        elif tool_name == "convert_url":
-            result = convert_url(args.get("url"))
-        elif tool_name == "convert_batch":
-            result = convert_batch(args.get("paths"))
-        elif tool_name == "get_supported_formats":
-            result = get_supported_formats()
+            # Stream partial Markdown page by page
+            path = args.get("path")
+            if not path or not os.path.exists(path):
+                raise FileNotFoundError(f"File not found: {path}")
+            key = tool_flight_key(tool_name, args)
+            async for unit in get_flights().stream(key, lambda: stream_units(markitdown, path, tool=tool_name)):
+                if isinstance(unit, ConversionSummary):
+                    yield f"data: {json.dumps({'type': 'complete', 'result': unit.markdown, 'percent': 100, 'units': unit.units, 'ttfb_ms': unit.ttfb_ms, 'elapsed_ms': unit.elapsed_ms})}\n\n"
+                else:
+                    if unit.percent is not None:
+                        yield f"data: {json.dumps({'type': 'progress', 'message': f'Converted {unit.kind} {unit.index}/{unit.total}', 'percent': unit.percent})}\n\n"
+                    yield f"data: {json.dumps({'type': 'chunk', 'unit': unit.kind, 'index': unit.index, 'total': unit.total, 'content': unit.markdown})}\n\n"
         else:
-            raise ValueError(f"Unknown tool: {tool_name}")
-        
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Finalizing...', 'percent': 90})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        # Send result
-        yield f"data: {json.dumps({'type': 'complete', 'result': result, 'percent': 100})}\n\n"
+            # Execute the MCP tool off the event loop
+            result = await get_executor().run(run_tool, tool_name, args)
+            yield f"data: {json.dumps({'type': 'complete', 'result': result, 'percent': 100})}\n\n"
         
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
@@ -195,29 +211,39 @@ async def list_tools():
 @app.post("/mcp/call/{tool_name}")
 async def call_tool(tool_name: str, args: dict):
     """Call an MCP tool and return JSON response (non-streaming)"""
+    if tool_name not in TOOL_NAMES:
+        raise HTTPException(status_code=404, detail=f"Tool not found: {tool_name}")
+    
     try:
-        if tool_name == "convert_file":
-            result = convert_file(args.get("path"))
-        elif tool_name == "convert_url":
-            result = convert_url(args.get("url"))
-        elif tool_name == "convert_batch":
-            result = convert_batch(args.get("paths"))
-        elif tool_name == "get_supported_formats":
-            result = get_supported_formats()
-        else:
-            raise HTTPException(status_code=404, detail=f"Tool not found: {tool_name}")
-        
+        permit = await admit_tool(tool_name, args)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    try:
+        result = await get_flights().do(
+            tool_flight_key(tool_name, args),
+            lambda: get_executor().run(run_tool, tool_name, args)
+        )
         return {"success": True, "result": result}
     
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        permit.release()
 
 
 @app.post("/mcp/stream/{tool_name}")
 async def stream_tool(tool_name: str, args: dict):
     """Call an MCP tool with streaming SSE response"""
-    return StreamingResponse(
-        stream_tool_execution(tool_name, args),
+    try:
+        permit = await admit_tool(tool_name, args)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    return AdmittedStreamingResponse(
+        permit, stream_tool_execution(tool_name, args),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -230,36 +256,53 @@ async def stream_tool(tool_name: str, args: dict):
 async def upload_and_convert(file: UploadFile = File(...)):
     """Upload a file and convert with streaming progress"""
     
-    # Save uploaded file temporarily
-    suffix = Path(file.filename).suffix
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    # FastAPI has already received the body to parse File(...); admitting first
+    # keeps an overloaded server from spooling and converting it
+    try:
+        permit = await get_admission().acquire(cost_for(Path(file.filename or "").suffix))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    # Stream upload to a temp file in chunks, hashing it as it arrives
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        permit.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        permit.release()
+        raise
+    
+    leader = False
+    
+    def start_conversion():
+        nonlocal leader
+        leader = True
+        return stream_upload_units(markitdown, upload)
     
     async def stream_upload_conversion():
         try:
-            yield f"data: {json.dumps({'type': 'start', 'filename': file.filename})}\n\n"
-            await asyncio.sleep(0.1)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': 'Processing upload...', 'percent': 30})}\n\n"
-            await asyncio.sleep(0.1)
+            yield f"data: {json.dumps({'type': 'start', 'filename': upload.filename, 'size': upload.size})}\n\n"
             
-            result = convert_file(tmp_path)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'message': 'Finalizing...', 'percent': 90})}\n\n"
-            await asyncio.sleep(0.1)
-            
-            yield f"data: {json.dumps({'type': 'complete', 'result': result, 'percent': 100})}\n\n"
+            # Identical uploads in flight share one conversion
+            key = upload_flight_key(upload.digest, Path(upload.path).suffix)
+            async for unit in get_flights().stream(key, start_conversion):
+                if isinstance(unit, ConversionSummary):
+                    yield f"data: {json.dumps({'type': 'complete', 'result': unit.markdown, 'percent': 100, 'units': unit.units, 'ttfb_ms': unit.ttfb_ms, 'elapsed_ms': unit.elapsed_ms})}\n\n"
+                else:
+                    if unit.percent is not None:
+                        yield f"data: {json.dumps({'type': 'progress', 'message': f'Converted {unit.kind} {unit.index}/{unit.total}', 'percent': unit.percent})}\n\n"
+                    yield f"data: {json.dumps({'type': 'chunk', 'unit': unit.kind, 'index': unit.index, 'total': unit.total, 'content': unit.markdown})}\n\n"
             
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
         finally:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            # A coalesced request never converts its own copy; the leader's copy is removed by stream_upload_units
+            if not leader:
+                upload.cleanup()
     
-    return StreamingResponse(
-        stream_upload_conversion(),
+    return AdmittedStreamingResponse(
+        permit, stream_upload_conversion(),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -268,10 +311,23 @@ async def upload_and_convert(file: UploadFile = File(...)):
     )
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 while saturated so the router stops sending new work"""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 @app.get("/health")
 async def health():
     """Health check"""
-    return {"status": "healthy", "transport": "HTTP", "streaming": "enabled"}
+    return {"status": "healthy", "transport": "HTTP", "streaming": "enabled", "cache": cache_stats(), "executor": get_executor().stats(), "coalescing": get_flights().stats(), "admission": get_admission().stats()}
 
 
 if __name__ == "__main__":
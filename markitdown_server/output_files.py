@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Output Files
+
+Collision-free, atomic publishing of output files for the watcher and the
+web server. Content is written to a hidden temp file in the destination
+folder and only then given its name, so readers never see a half-written
+file. The plain name (report.md) is claimed with a hard link, which fails
+instead of overwriting when the name is taken; the fallback is the name
+plus a prefix of the source's content hash (report_3fa9c1d2e4b5.md),
+replaced atomically since that name can only belong to the same content.
+Either way it costs at most two attempts, however many files share a name.
+"""
+
+import errno
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+HASH_SUFFIX_LENGTH = 12
+
+# mkstemp creates files as 0600; published files get the usual 0666 less the
+# umask instead. Read once here: setting and restoring it per file would race
+# with other threads creating files.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def hashed_name(stem: str, suffix: str, digest: str) -> str:
+    return f"{stem}_{digest[:HASH_SUFFIX_LENGTH]}{suffix}"
+
+
+def _publish(temp: Path, directory: Path, stem: str, suffix: str, digest: str) -> Path:
+    """Give temp (already in directory) its final name; returns that path."""
+    target = directory / f"{stem}{suffix}"
+    try:
+        os.link(temp, target)
+    except FileExistsError:
+        target = directory / hashed_name(stem, suffix, digest)
+        os.replace(temp, target)
+        return target
+    except OSError as e:
+        # No hard links on this filesystem: replace the hashed name instead
+        if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK):
+            raise
+        target = directory / hashed_name(stem, suffix, digest)
+        os.replace(temp, target)
+        return target
+    os.unlink(temp)
+    return target
+
+
+def _temp_file(directory: Path, suffix: str, mode: str = "w", **kwargs):
+    f = tempfile.NamedTemporaryFile(mode, dir=directory, prefix=".", suffix=suffix + ".tmp", delete=False, **kwargs)
+    os.chmod(f.name, FILE_MODE)
+    return f
+
+
+def write_atomic(directory: Path, stem: str, suffix: str, digest: str, write) -> Path:
+    """Create stem+suffix (or its hashed name) in directory with write(f) on a text file; returns the path."""
+    f = _temp_file(directory, suffix, encoding="utf-8")
+    try:
+        with f:
+            write(f)
+        return _publish(Path(f.name), directory, stem, suffix, digest)
+    except BaseException:
+        if os.path.exists(f.name):
+            os.unlink(f.name)
+        raise
+
+
+def move_atomic(source: Path, directory: Path, digest: str) -> Path:
+    """Move source into directory under its own name (or its hashed name); returns the new path."""
+    try:
+        # Publishing links the new name before dropping the old one, so source
+        # is its own temp file as long as both are on one filesystem
+        target = _publish(source, directory, source.stem, source.suffix, digest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        with _temp_file(directory, source.suffix, mode="wb") as f:
+            pass
+        try:
+            # Keeps the mode and timestamps, as a rename would
+            shutil.copy2(source, f.name)
+            target = _publish(Path(f.name), directory, source.stem, source.suffix, digest)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+        os.unlink(source)
+    return target
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Progressive Conversion
+
+Converts documents one unit at a time (PDF pages, XLSX sheets, PPTX slides) so
+the SSE endpoints can stream real progress and partial Markdown as each unit
+finishes. Other formats are converted in one piece. The concatenated units
+match MarkItDown's own output, and the final result is stored in the
+conversion cache.
+
+The XLSX and PPTX splitters reuse private MarkItDown helpers, which is why
+requirements.txt pins markitdown. If a release moves them, the splitter
+fails before producing anything and the document is converted whole.
+"""
+
+import asyncio
+import html
+import io
+import re
+import threading
+import time
+from pathlib import Path
+
+from conversion_cache import CachedResult, file_digest, get_cache
+from conversion_executor import get_executor
+from conversion_metrics import track_conversion
+
+
+class ConversionUnit:
+    """One converted piece of a document."""
+
+    def __init__(self, kind: str, index: int, total: int | None, markdown: str):
+        self.kind = kind
+        self.index = index
+        self.total = total
+        self.markdown = markdown
+
+    @property
+    def percent(self) -> int | None:
+        if not self.total:
+            return None
+        # 100% is reserved for the final 'complete' event
+        return min(99, round(self.index / self.total * 100))
+
+
+class ConversionSummary:
+    """Final item of stream_units: the complete Markdown plus timings."""
+
+    def __init__(self, markdown: str, units: int, ttfb_ms: float, elapsed_ms: float):
+        self.markdown = markdown
+        self.units = units
+        self.ttfb_ms = ttfb_ms
+        self.elapsed_ms = elapsed_ms
+
+
+def _pdf_units(path: str):
+    """Yield PDF pages; mirrors pdfminer.high_level.extract_text used by MarkItDown."""
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    with open(path, "rb") as fp, io.StringIO() as output:
+        document = PDFDocument(PDFParser(fp))
+        try:
+            total = int(resolve1(resolve1(document.catalog["Pages"])["Count"]))
+        except (KeyError, TypeError, ValueError):
+            total = None
+
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = TextConverter(rsrcmgr, output, codec="utf-8", laparams=LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for index, page in enumerate(PDFPage.create_pages(document), start=1):
+            interpreter.process_page(page)
+            text = output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            yield ConversionUnit("page", index, total, text)
+
+
+def _xlsx_units(path: str):
+    """Yield one Markdown table per sheet; mirrors MarkItDown's XlsxConverter."""
+    import pandas as pd
+
+    html_converter = _markitdown_converter("HtmlConverter", "_convert")
+    with pd.ExcelFile(path, engine="openpyxl") as workbook:
+        total = len(workbook.sheet_names)
+        for index, name in enumerate(workbook.sheet_names, start=1):
+            html_content = workbook.parse(name).to_html(index=False)
+            text = f"## {name}\n" + html_converter._convert(html_content).text_content.strip() + "\n\n"
+            yield ConversionUnit("sheet", index, total, text)
+
+
+def _pptx_units(path: str):
+    """Yield one Markdown section per slide; mirrors MarkItDown's PptxConverter (without LLM captions)."""
+    import pptx
+
+    converter = _markitdown_converter("PptxConverter", "_is_picture", "_is_table", "_convert_chart_to_markdown", "_convert")
+    presentation = pptx.Presentation(path)
+    total = len(presentation.slides)
+    for index, slide in enumerate(presentation.slides, start=1):
+        text = f"\n\n<!-- Slide number: {index} -->\n"
+        title = slide.shapes.title
+        for shape in slide.shapes:
+            if converter._is_picture(shape):
+                alt_text = None
+                try:
+                    alt_text = shape._element._nvXxPr.cNvPr.attrib.get("descr", "")
+                except Exception:
+                    pass
+                filename = re.sub(r"\W", "", shape.name) + ".jpg"
+                text += "\n![" + (alt_text or shape.name) + "](" + filename + ")\n"
+
+            if converter._is_table(shape):
+                html_table = "<html><body><table>"
+                first_row = True
+                for row in shape.table.rows:
+                    html_table += "<tr>"
+                    for cell in row.cells:
+                        tag = "th" if first_row else "td"
+                        html_table += f"<{tag}>" + html.escape(cell.text) + f"</{tag}>"
+                    html_table += "</tr>"
+                    first_row = False
+                html_table += "</table></body></html>"
+                text += "\n" + converter._convert(html_table).text_content.strip() + "\n"
+
+            if shape.has_chart:
+                text += converter._convert_chart_to_markdown(shape.chart)
+            elif shape.has_text_frame:
+                if shape == title:
+                    text += "# " + shape.text.lstrip() + "\n"
+                else:
+                    text += shape.text + "\n"
+
+        text = text.rstrip()
+        if slide.has_notes_slide:
+            text += "\n\n### Notes:\n"
+            notes_frame = slide.notes_slide.notes_text_frame
+            if notes_frame is not None:
+                text += notes_frame.text
+            text = text.rstrip()
+
+        yield ConversionUnit("slide", index, total, text)
+
+
+def normalize(text: str) -> str:
+    """Apply the whitespace clean-up MarkItDown performs on every result."""
+    text = "\n".join(line.rstrip() for line in re.split(r"\r?\n", text))
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+class _Normalizer:
+    """
+    normalize() over a text that arrives in pieces.
+
+    feed() returns the part of the normalized text each piece settles, so the
+    returned parts join to exactly normalize(whole), or normalize(whole.strip())
+    with strip. Held back meanwhile are only what the rest of the text decides:
+    trailing spaces of the current line and, with strip, trailing line breaks.
+    """
+
+    def __init__(self, strip: bool = False):
+        self.strip = strip
+        self.started = False
+        self.line = ""
+        self.sent = 0
+        self.breaks = 0
+        self.sent_breaks = 0
+
+    def feed(self, raw: str) -> str:
+        if self.strip and not self.started:
+            raw = raw.lstrip()
+            if not raw:
+                return ""
+            self.started = True
+        out = []
+        first, *rest = raw.split("\n")
+        self._extend(first, out)
+        for piece in rest:
+            self.line, self.sent = "", 0
+            self.breaks += 1
+            if not self.strip:
+                self._send_breaks(out)
+            self._extend(piece, out)
+        return "".join(out)
+
+    def _extend(self, piece: str, out: list):
+        self.line += piece
+        text = self.line.rstrip()
+        if len(text) > self.sent:
+            self._send_breaks(out)
+            out.append(text[self.sent:])
+            self.sent = len(text)
+            self.breaks = self.sent_breaks = 0
+
+    def _send_breaks(self, out: list):
+        # Runs of three or more line breaks collapse to two
+        due = min(self.breaks, 2)
+        out.append("\n" * (due - self.sent_breaks))
+        self.sent_breaks = due
+
+
+def _markitdown_converter(name: str, *methods: str):
+    """An instance of a converter class from markitdown's private module, checked for the methods used."""
+    from markitdown import _markitdown
+
+    cls = getattr(_markitdown, name)
+    missing = [method for method in methods if not callable(getattr(cls, method, None))]
+    if missing:
+        raise AttributeError(f"markitdown {name} has no {', '.join(missing)}")
+    return cls()
+
+
+# Extension -> (splitter, whether MarkItDown strips the converter's output)
+UNIT_SPLITTERS = {
+    ".pdf": (_pdf_units, False),
+    ".xlsx": (_xlsx_units, True),
+    ".pptx": (_pptx_units, True),
+}
+
+
+def iter_conversion(converter, path: str, digest: str | None = None, cancelled: threading.Event | None = None):
+    """
+    Convert a local file unit by unit, consulting the conversion cache first.
+
+    Yields ConversionUnit objects and returns the final Markdown text.
+    """
+    extension = Path(path).suffix.lower()
+    cache = get_cache()
+    key = cache.key(digest or file_digest(path), extension) if cache is not None else None
+
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield ConversionUnit("document", 1, 1, cached.text_content)
+            return cached.text_content
+
+    splitter, strip = UNIT_SPLITTERS.get(extension, (None, False))
+    text = None
+    if splitter is not None:
+        units = splitter(path)
+        # The joined units are normalized as one text, so the streamed pieces add up to the result
+        normalizer = _Normalizer(strip)
+        parts = []
+        emitted = False
+        try:
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    units.close()
+                    return None
+                unit = next(units)
+                unit.markdown = normalizer.feed(unit.markdown)
+                parts.append(unit.markdown)
+                emitted = True
+                yield unit
+        except StopIteration:
+            text = "".join(parts)
+        except Exception:
+            # Fall back to MarkItDown unless partial output has already been sent
+            if emitted:
+                raise
+        if text is not None and cache is not None:
+            cache.put(key, CachedResult(text))
+
+    if text is None:
+        result = converter.convert(path)
+        text = result.text_content
+        if cache is not None:
+            cache.put(key, result)
+        yield ConversionUnit("document", 1, 1, text)
+    return text
+
+
+async def stream_units(converter, path: str, digest: str | None = None, tool: str = "stream"):
+    """
+    Async generator over iter_conversion; the conversion runs on the executor.
+
+    Yields ConversionUnit objects as they finish, then a ConversionSummary.
+    tool labels the conversion in the metrics.
+    """
+    with track_conversion(tool, path) as record:
+        async for item in _stream_units(converter, path, digest):
+            if isinstance(item, ConversionSummary):
+                record.markdown = item.markdown
+            yield item
+
+
+async def _stream_units(converter, path: str, digest: str | None):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+    done = object()
+    outcome = {}
+    started = time.monotonic()
+
+    def pump():
+        units = iter_conversion(converter, path, digest, cancelled)
+        while True:
+            try:
+                unit = next(units)
+            except StopIteration as stop:
+                outcome["markdown"] = stop.value
+                return
+            loop.call_soon_threadsafe(queue.put_nowait, unit)
+
+    task = asyncio.ensure_future(get_executor().run(pump))
+    task.add_done_callback(lambda _: queue.put_nowait(done))
+
+    ttfb = None
+    units = 0
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if ttfb is None:
+                ttfb = time.monotonic() - started
+            units += 1
+            yield item
+        await task
+    finally:
+        cancelled.set()
+
+    yield ConversionSummary(
+        markdown=outcome.get("markdown") or "",
+        units=units,
+        ttfb_ms=round((ttfb or 0.0) * 1000, 2),
+        elapsed_ms=round((time.monotonic() - started) * 1000, 2),
+    )
+
+
+async def stream_upload_units(converter, upload):
+    """stream_units over a SpooledUpload, removing its temp file once the conversion ends."""
+    try:
+        async for item in stream_units(converter, upload.path, upload.digest, tool="upload"):
+            yield item
+    finally:
+        upload.cleanup()
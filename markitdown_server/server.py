@@ -1,5 +1,7 @@
 from fastmcp import FastMCP
 from markitdown import MarkItDown
+from conversion_cache import convert_cached
+from batch_engine import get_engine
 import os
 
 app = FastMCP(name="markitdown", instructions="Convert files and URLs to Markdown format")
@@ -12,7 +14,7 @@ def convert_file(path: str):
         if not os.path.exists(path):
             return {"error": f"File not found: {path}"}
         
-        result = md.convert(path)
+        result = convert_cached(md, path)
         return {
             "success": True,
             "markdown": result.text_content,
@@ -38,30 +40,8 @@ def convert_url(url: str):
 
 @app.tool(description="Convert multiple files to Markdown")
 def convert_batch(paths: list):
-    """Convert multiple files to Markdown in batch."""
-    results = []
-    for path in paths:
-        try:
-            if os.path.exists(path):
-                result = md.convert(path)
-                results.append({
-                    "success": True,
-                    "path": path,
-                    "markdown": result.text_content,
-                    "title": result.title if hasattr(result, 'title') else None
-                })
-            else:
-                results.append({
-                    "success": False,
-                    "path": path,
-                    "error": "File not found"
-                })
-        except Exception as e:
-            results.append({
-                "success": False,
-                "path": path,
-                "error": str(e)
-            })
+    """Convert multiple files to Markdown in batch, in parallel across worker processes."""
+    results = get_engine().convert_batch(paths)
     
     return {
         "total": len(paths),
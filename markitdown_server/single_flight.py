@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Single-Flight Coalescing
+
+Concurrent requests for the same document (same content hash, file or URL)
+attach to one running conversion instead of each starting their own. Plain
+calls share the result; streamed calls share the event stream, with late
+joiners replaying the events they missed. A shared stream is cancelled once
+its last subscriber has gone, so no conversion runs for nobody.
+"""
+
+import asyncio
+import os
+
+
+def tool_flight_key(tool_name: str, args: dict) -> str | None:
+    """Key identifying identical tool calls, or None when the call should not be coalesced."""
+    if tool_name == "convert_url" and args.get("url"):
+        return f"url:{args['url']}"
+    if tool_name == "convert_file" and args.get("path"):
+        try:
+            st = os.stat(args["path"])
+        except OSError:
+            return None
+        return f"file:{os.path.realpath(args['path'])}:{st.st_size}:{st.st_mtime_ns}"
+    return None
+
+
+def upload_flight_key(digest: str, extension: str) -> str:
+    return f"sha256:{digest}:{extension.lower()}"
+
+
+class _Broadcast:
+    """Event history of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent work by key; must be used from a single event loop."""
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str | None, factory):
+        """Await factory() once per key; concurrent callers share its result."""
+        if key is None:
+            return await factory()
+
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting does not cancel the shared work
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str | None, factory):
+        """
+        Iterate factory() (an async iterator) once per key.
+
+        factory is only called for the first subscriber; the stream runs in
+        its own task, so it outlives that subscriber as long as any other
+        remains, and is cancelled when the last one goes away.
+        """
+        if key is None:
+            async for item in factory():
+                yield item
+            return
+
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Broadcast()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._produce(key, flight, factory))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        try:
+            async for item in flight.subscribe():
+                yield item
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # Later callers for key start afresh instead of joining a cancelled stream
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+                flight.task.cancel()
+                self.abandoned += 1
+
+    async def _produce(self, key: str, flight: _Broadcast, factory):
+        error = None
+        try:
+            # Called here rather than in stream() so a flight cancelled before
+            # it starts never calls factory at all
+            async for item in factory():
+                flight.publish(item)
+        except Exception as e:
+            error = e
+        finally:
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            flight.finish(error)
+
+    def in_flight(self, key: str | None) -> bool:
+        """Whether work for key is currently running."""
+        return key is not None and (key in self._calls or key in self._streams)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+_flights = None
+
+
+def get_flights() -> SingleFlight:
+    """Return the process-wide single-flight registry."""
+    global _flights
+    if _flights is None:
+        _flights = SingleFlight()
+    return _flights
@@ -5,14 +5,20 @@ Provides real-time streaming responses for document conversion with progress upd
 """
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from markitdown import MarkItDown
+from conversion_cache import cache_stats
+from conversion_executor import get_executor
+from progressive import stream_units, ConversionSummary
+from upload_spool import spool_upload, SpooledUpload, UploadTooLarge
+from admission import get_admission, cost_for, AdmittedStreamingResponse, AdmissionRejected
+from conversion_metrics import readiness
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import json
 import asyncio
 from pathlib import Path
-import tempfile
 import os
 from datetime import datetime
 
@@ -51,35 +57,26 @@ SUPPORTED_FORMATS = {
 }
 
 
-async def stream_conversion(file_path: str, filename: str):
+async def stream_conversion(upload: SpooledUpload):
     """Stream conversion progress and result as Server-Sent Events"""
     try:
         # Send start event
-        yield f"data: {json.dumps({'type': 'start', 'filename': filename, 'timestamp': datetime.now().isoformat()})}\n\n"
-        await asyncio.sleep(0.1)
+        yield f"data: {json.dumps({'type': 'start', 'filename': upload.filename, 'size': upload.size, 'timestamp': datetime.now().isoformat()})}\n\n"
         
-        # Send progress event
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Reading file...', 'percent': 30})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        # Convert the file
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Converting to Markdown...', 'percent': 60})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        result = markitdown.convert(file_path)
-        
-        yield f"data: {json.dumps({'type': 'progress', 'message': 'Finalizing...', 'percent': 90})}\n\n"
-        await asyncio.sleep(0.1)
-        
-        # Send completion event
-        yield f"data: {json.dumps({'type': 'complete', 'content': result.text_content, 'percent': 100})}\n\n"
+        # Stream each page/sheet/slide as soon as the converter finishes it
+        async for unit in stream_units(markitdown, upload.path, upload.digest, tool="upload"):
+            if isinstance(unit, ConversionSummary):
+                yield f"data: {json.dumps({'type': 'complete', 'content': unit.markdown, 'percent': 100, 'units': unit.units, 'ttfb_ms': unit.ttfb_ms, 'elapsed_ms': unit.elapsed_ms})}\n\n"
+            else:
+                if unit.percent is not None:
+                    yield f"data: {json.dumps({'type': 'progress', 'message': f'Converted {unit.kind} {unit.index}/{unit.total}', 'percent': unit.percent})}\n\n"
+                yield f"data: {json.dumps({'type': 'chunk', 'unit': unit.kind, 'index': unit.index, 'total': unit.total, 'content': unit.markdown})}\n\n"
         
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
     finally:
         # Clean up temp file
-        if os.path.exists(file_path):
-            os.unlink(file_path)
+        upload.cleanup()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -410,6 +407,8 @@ async def root():
         
         async function handleFile(file) {
             currentFilename = file.name;
+            convertedContent = '';
+            resultContent.textContent = '';
             uploadArea.style.display = 'none';
             progressContainer.style.display = 'block';
             resultContainer.style.display = 'none';
@@ -425,13 +424,16 @@ async def root():
                 
                 const reader = response.body.getReader();
                 const decoder = new TextDecoder();
+                let buffer = '';
                 
                 while (true) {
                     const { done, value } = await reader.read();
                     if (done) break;
                     
-                    const chunk = decoder.decode(value);
-                    const lines = chunk.split('\n\n');
+                    // Events can span reads once partial content is streamed
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\\n\\n');
+                    buffer = lines.pop();
                     
                     for (const line of lines) {
                         if (line.startsWith('data: ')) {
@@ -457,6 +459,13 @@ async def root():
                     statusText.textContent = data.message;
                     break;
                     
+                case 'chunk':
+                    // Show partial Markdown as each page/sheet/slide arrives
+                    convertedContent += data.content;
+                    resultContainer.style.display = 'block';
+                    resultContent.textContent = convertedContent;
+                    break;
+                    
                 case 'complete':
                     progressBar.style.width = '100%';
                     progressBar.textContent = '100%';
@@ -508,16 +517,26 @@ async def root():
 async def convert_file_stream(file: UploadFile = File(...)):
     """Convert file with streaming progress updates"""
     
-    # Save uploaded file temporarily
-    suffix = Path(file.filename).suffix
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    # FastAPI has already received the body to parse File(...); admitting first
+    # keeps an overloaded server from spooling and converting it
+    try:
+        permit = await get_admission().acquire(cost_for(Path(file.filename or "").suffix))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    # Stream upload to a temp file in chunks, hashing it as it arrives
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        permit.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        permit.release()
+        raise
     
     # Stream the conversion
-    return StreamingResponse(
-        stream_conversion(tmp_path, file.filename),
+    return AdmittedStreamingResponse(
+        permit, stream_conversion(upload),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -532,10 +551,23 @@ async def get_formats():
     return {"formats": SUPPORTED_FORMATS}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 while saturated so the router stops sending new work"""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "markitdown-streaming"}
+    return {"status": "healthy", "service": "markitdown-streaming", "cache": cache_stats(), "executor": get_executor().stats(), "admission": get_admission().stats()}
 
 
 if __name__ == "__main__":
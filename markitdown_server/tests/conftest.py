@@ -0,0 +1,5 @@
+import os
+import sys
+
+# markitdown_server's modules import each other by bare name, as when a server runs as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
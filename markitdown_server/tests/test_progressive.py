@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+import progressive
+from progressive import _Normalizer, _markitdown_converter, iter_conversion, normalize
+
+# Characters normalize() treats specially, plus some text between them
+ALPHABET = ["a", "b", " ", "\t", "\n", "\r", "\x0c", "\r\n", "  ", "\n\n\n"]
+
+
+@pytest.mark.parametrize("strip", [False, True])
+def test_normalizer_matches_normalize_whatever_the_split(strip):
+    rng = random.Random(1)
+    for _ in range(5000):
+        pieces = ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 6))) for _ in range(rng.randint(0, 6))]
+        whole = "".join(pieces)
+        normalizer = _Normalizer(strip)
+        assert "".join(normalizer.feed(p) for p in pieces) == normalize(whole.strip() if strip else whole), pieces
+
+
+def test_missing_private_helper_is_reported():
+    with pytest.raises(AttributeError, match="_no_such_method"):
+        _markitdown_converter("PptxConverter", "_is_table", "_no_such_method")
+
+
+@pytest.fixture
+def deck(tmp_path):
+    pptx = pytest.importorskip("pptx")
+    presentation = pptx.Presentation()
+    for title, body in [("First", "one\n\n\n\ntwo  "), ("Second", "three")]:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = title
+        slide.placeholders[1].text = body
+    path = tmp_path / "deck.pptx"
+    presentation.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    markitdown = pytest.importorskip("markitdown")
+    monkeypatch.setattr(progressive, "get_cache", lambda: None)
+    return markitdown.MarkItDown()
+
+
+def units_and_text(converter, path):
+    units = []
+    conversion = iter_conversion(converter, path)
+    try:
+        while True:
+            units.append(next(conversion))
+    except StopIteration as stop:
+        return units, stop.value
+
+
+def test_slides_stream_and_add_up_to_markitdown(converter, deck):
+    units, text = units_and_text(converter, deck)
+    assert [u.kind for u in units] == ["slide", "slide"]
+    assert "".join(u.markdown for u in units) == text == converter.convert(deck).text_content
+
+
+def test_falls_back_to_markitdown_without_private_helpers(converter, deck, monkeypatch):
+    # As if a markitdown release had moved one of the helpers the slide splitter needs
+    monkeypatch.setattr(progressive, "_markitdown_converter",
+                        lambda name, *methods: _markitdown_converter(name, *methods, "_moved_in_a_later_release"))
+    units, text = units_and_text(converter, deck)
+    assert [u.kind for u in units] == ["document"]
+    assert units[0].markdown == text == converter.convert(deck).text_content
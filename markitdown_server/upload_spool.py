@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Upload Spooler
+
+Streams an UploadFile to a temporary file in fixed-size chunks instead of
+reading it into memory, hashing the content on the fly (the digest feeds the
+conversion cache) and enforcing per-format size limits as bytes arrive.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import UploadFile
+
+# Configuration
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR") or None
+UPLOAD_CHUNK_SIZE = int(os.environ.get("MARKITDOWN_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE", str(100 * 1024 * 1024)))
+
+
+def max_size_for(extension: str) -> int:
+    """Size limit for an extension; MAX_FILE_SIZE_<EXT> (e.g. MAX_FILE_SIZE_PDF) overrides MAX_FILE_SIZE."""
+    ext = extension.lower().lstrip(".")
+    if ext:
+        override = os.environ.get(f"MAX_FILE_SIZE_{ext.upper()}")
+        if override:
+            return int(override)
+    return MAX_FILE_SIZE
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the limit for its format."""
+
+    def __init__(self, filename: str, limit: int):
+        super().__init__(f"File too large: {filename} exceeds {limit} bytes")
+        self.filename = filename
+        self.limit = limit
+
+
+class SpooledUpload:
+    """An upload written to disk, with its size and SHA-256 digest."""
+
+    def __init__(self, path: str, filename: str, size: int, digest: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.digest = digest
+
+    def cleanup(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def spool_upload(file: UploadFile, suffix: str | None = None) -> SpooledUpload:
+    """Write an upload to a temporary file chunk by chunk; raises UploadTooLarge."""
+    filename = file.filename or "upload"
+    if suffix is None:
+        suffix = Path(filename).suffix
+    limit = max_size_for(suffix)
+
+    # Reject early when the client declared the size up front
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge(filename, limit)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(filename, limit)
+                digest.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return SpooledUpload(path, filename, size, digest.hexdigest())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Watcher Journal
+
+SQLite record of every file the watcher has taken on, keyed by path and
+identified by size, mtime and content hash: in flight, converted (Markdown
+written, original not yet moved), done or failed. On startup the watcher
+compares one directory scan against it and resumes only the outstanding
+work, so files dropped while it was down are converted, a crash between
+writing the Markdown and moving the original only redoes the move, and
+files that failed are not retried until they change. The content hash
+index also lets the watcher find an earlier conversion of identical bytes.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+OUTSTANDING_STATES = ("in_flight", "converted")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    state TEXT NOT NULL,
+    output TEXT,
+    moved_to TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+"""
+
+
+class WatchJournal:
+    """Per-file conversion state shared by the watcher's worker threads."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock, self._db:
+            self._db.execute(sql, params)
+
+    def begin(self, path: str, size: int, mtime_ns: int, sha256: str):
+        """Record that path (with this size, mtime and hash) is being converted."""
+        self._write(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, state, updated_at) "
+            "VALUES (?, ?, ?, ?, 'in_flight', ?)",
+            (path, size, mtime_ns, sha256, time.time()),
+        )
+
+    def converted(self, path: str, output: str):
+        self._write("UPDATE files SET state = 'converted', output = ?, updated_at = ? WHERE path = ?",
+                    (output, time.time(), path))
+
+    def done(self, path: str, moved_to: str):
+        self._write("UPDATE files SET state = 'done', moved_to = ?, updated_at = ? WHERE path = ?",
+                    (moved_to, time.time(), path))
+
+    def failed(self, path: str, error: str):
+        self._write("UPDATE files SET state = 'failed', error = ?, updated_at = ? WHERE path = ?",
+                    (error, time.time(), path))
+
+    def forget(self, paths: list):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+
+    def outputs_for(self, sha256: str) -> list:
+        """(source path, output path) of earlier conversions of this content, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, output FROM files WHERE sha256 = ? AND state IN ('converted', 'done') "
+                "AND output IS NOT NULL ORDER BY updated_at",
+                (sha256,),
+            ).fetchall()
+        return [(row["path"], row["output"]) for row in rows]
+
+    def entries(self, states: tuple) -> dict:
+        """{path: row} for every file in one of states, loaded in one query for a startup scan."""
+        marks = ", ".join("?" * len(states))
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM files WHERE state IN ({marks})", states).fetchall()
+        return {row["path"]: row for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+MarkItDown Watcher Shards
+
+Spreads watcher events over several worker processes so ingestion of very
+large drop trees scales with cores. Each path is routed to the shard chosen
+by a stable hash of the path, so all events for one file reach the same
+process in order. Each shard runs its own StabilityTracker and converter.
+
+Events are coalesced before they cross the process boundary: a router
+thread collects them for a short window, keeps one entry per path (the
+latest event wins, so a write after a close reopens the file) and sends
+each shard one batch, so storms of modify and move events for the same
+files cost one message rather than thousands.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+
+from file_stability import StabilityTracker, WATCH_WORKERS
+
+# Configuration
+# One process unless asked: each shard is an interpreter with its own MarkItDown
+WATCH_SHARDS = int(os.environ.get("MARKITDOWN_WATCH_SHARDS", "1"))
+WATCH_COALESCE_SECONDS = float(os.environ.get("MARKITDOWN_WATCH_COALESCE", "0.05"))
+
+# Spawned rather than forked: the watcher runs observer threads that must not
+# be duplicated into the children (see batch_engine.py)
+_mp = multiprocessing.get_context("spawn")
+
+
+def shard_of(path, shards: int) -> int:
+    """Shard for a path; stable across processes and restarts, unlike hash()."""
+    return zlib.crc32(os.fsencode(path)) % shards
+
+
+def _shard_main(inbox, make_converter, workers: int, close_events: bool):
+    """Shard process loop: feed batches of (path, event) into a local tracker."""
+    # Ctrl+C reaches the whole process group; the parent coordinates shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    converter = make_converter()
+    tracker = StabilityTracker(converter.convert_document, workers=workers, close_events=close_events)
+    tracker.start()
+    try:
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                break
+            for path, event in batch:
+                tracker.notify(path, event)
+    finally:
+        tracker.stop()
+        converter.close()
+
+
+class ShardedTracker:
+    """StabilityTracker interface over a set of shard processes.
+
+    make_converter is a module-level callable (it is pickled by name) that
+    each shard calls once to build an object with convert_document(path)
+    and close().
+    """
+
+    def __init__(self, make_converter, shards: int = WATCH_SHARDS, workers: int = WATCH_WORKERS,
+                 close_events: bool = False, coalesce_seconds: float = WATCH_COALESCE_SECONDS):
+        self.shards = max(1, shards)
+        # workers is the total; each shard runs its share as threads
+        self.workers = max(self.shards, workers)
+        self.coalesce_seconds = coalesce_seconds
+        self._events = queue.SimpleQueue()
+        self._inboxes = [_mp.Queue() for _ in range(self.shards)]
+        self._processes = [
+            _mp.Process(
+                target=_shard_main,
+                args=(inbox, make_converter, max(1, self.workers // self.shards), close_events),
+                name=f"watcher-shard-{i}",
+                daemon=True,
+            )
+            for i, inbox in enumerate(self._inboxes)
+        ]
+        self._router = threading.Thread(target=self._route, name="watcher-router", daemon=True)
+        self.received = 0
+        self.sent = 0
+
+    def notify(self, path, event: str = "modified"):
+        """Record an event for path; safe and cheap to call from the observer thread."""
+        self._events.put((path, event))
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+        self._router.start()
+
+    def stop(self, wait: bool = True):
+        """Flush pending events, then stop every shard once its running conversions finish."""
+        self._events.put(None)
+        self._router.join()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout=None if wait else 5)
+            if process.is_alive():
+                process.kill()
+
+    def _route(self):
+        stopping = False
+        while not stopping:
+            item = self._events.get()
+            batch = {}
+            deadline = time.monotonic() + self.coalesce_seconds
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                path, event = item
+                # Re-inserting moves nothing: a path keeps its first position, with its latest event
+                batch[path] = event
+                self.received += 1
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._events.get(timeout=timeout) if timeout > 0 else self._events.get_nowait()
+                except queue.Empty:
+                    break
+            by_shard = {}
+            for path, event in batch.items():
+                by_shard.setdefault(shard_of(path, self.shards), []).append((path, event))
+            for index, items in by_shard.items():
+                self._inboxes[index].put(items)
+                self.sent += len(items)
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.shards,
+            "workers": self.workers,
+            "alive": sum(p.is_alive() for p in self._processes),
+            "events": self.received,
+            "coalesced": self.received - self.sent,
+        }
@@ -4,20 +4,38 @@ MarkItDown File Watcher Service
 
 Monitors a directory for new documents and automatically converts them to Markdown.
 Converted files are saved with .md extension in an output directory.
+
+Watchdog callbacks only enqueue paths. Files are converted by a bounded worker
+pool once they have finished being written (see file_stability.py). Progress is
+kept in a journal (see watch_journal.py), so a restart scans the directory once
+and resumes only the outstanding work. Files whose content was converted before
+are not converted again: their Markdown is copied from the earlier output under
+a header naming the new source. The folder is watched recursively, with
+subfolders mirrored under the output and processed folders; with more than one
+shard the events are spread over worker processes by path (see watch_shards.py).
 """
 
 import os
+import shutil
 import time
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from markitdown import MarkItDown
+from conversion_cache import convert_cached, file_digest
+from file_stability import StabilityTracker, WATCH_SETTLE_SECONDS
+from watch_journal import WatchJournal
+from watch_shards import ShardedTracker, WATCH_SHARDS
+from output_files import write_atomic, move_atomic
 from datetime import datetime
 
 # Configuration
-WATCH_DIR = Path("/Users/syedraza/Documents/markitdown")
-OUTPUT_DIR = Path("/Users/syedraza/Documents/markitdown/converted")
-PROCESSED_DIR = Path("/Users/syedraza/Documents/markitdown/processed")
+WATCH_DIR = Path(os.environ.get("MARKITDOWN_WATCH_DIR", "/Users/syedraza/Documents/markitdown"))
+OUTPUT_DIR = Path(os.environ.get("MARKITDOWN_WATCH_OUTPUT_DIR", WATCH_DIR / "converted"))
+PROCESSED_DIR = Path(os.environ.get("MARKITDOWN_WATCH_PROCESSED_DIR", WATCH_DIR / "processed"))
+WATCH_RECURSIVE = os.environ.get("MARKITDOWN_WATCH_RECURSIVE", "1") == "1"
+WATCH_DEDUP = os.environ.get("MARKITDOWN_WATCH_DEDUP", "1") == "1"
+JOURNAL_PATH = Path(os.environ.get("MARKITDOWN_WATCH_JOURNAL", WATCH_DIR / ".markitdown-watcher.sqlite3"))
 
 # Supported file extensions
 SUPPORTED_EXTENSIONS = {
@@ -26,101 +44,231 @@ SUPPORTED_EXTENSIONS = {
     '.jpg', '.jpeg', '.png', '.gif', '.wav'
 }
 
+def mirrored(base: Path, file_path: Path) -> Path:
+    """The folder under base matching file_path's subfolder of WATCH_DIR, created if needed."""
+    try:
+        relative = file_path.parent.relative_to(WATCH_DIR)
+    except ValueError:
+        return base
+    folder = base / relative
+    if relative.parts:
+        folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+class DocumentConverter:
+    """Converts settled documents and moves the originals; one per process.
+    
+    With convert=False it only journals and moves (what catch-up needs in a
+    parent whose shards do the converting) and skips building MarkItDown.
+    """
+    
+    def __init__(self, convert: bool = True):
+        self.md = MarkItDown() if convert else None
+        self.journal = WatchJournal(str(JOURNAL_PATH))
+    
+    def close(self):
+        self.journal.close()
+    
+    def convert_document(self, file_path: Path):
+        """Convert a document to Markdown; runs on a tracker worker, which reports errors."""
+        print(f"🔄 Processing: {file_path.name}")
+        st = file_path.stat()
+        digest = file_digest(str(file_path))
+        self.journal.begin(str(file_path), st.st_size, st.st_mtime_ns, digest)
+        try:
+            output_path = (WATCH_DEDUP and self.write_duplicate(file_path, digest)) or self.write_markdown(file_path, digest)
+        except BaseException as e:  # markitdown raises BaseException subclasses
+            self.journal.failed(str(file_path), str(e) or type(e).__name__)
+            raise
+        # If the move fails the file stays "converted" and the next start only retries the move
+        self.journal.converted(str(file_path), str(output_path))
+        self.move_processed(file_path, digest)
+    
+    def write_markdown(self, file_path: Path, digest: str) -> Path:
+        """Convert file_path and write its Markdown to OUTPUT_DIR; returns the output path."""
+        # Convert to markdown
+        result = convert_cached(self.md, str(file_path), digest=digest)
+        
+        def write(f):
+            # Add metadata header
+            f.write(f"<!-- \n")
+            f.write(f"Source: {file_path.name}\n")
+            f.write(f"Converted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            if hasattr(result, 'title') and result.title:
+                f.write(f"Title: {result.title}\n")
+            f.write(f"-->\n\n")
+            
+            # Write content
+            f.write(result.text_content)
+        
+        # Written to a temp file, then named after the source, or the source plus
+        # its content hash if that name is taken, in the same subfolder as the source
+        output_path = write_atomic(mirrored(OUTPUT_DIR, file_path), file_path.stem, ".md", digest, write)
+        
+        print(f"✅ Converted: {output_path.name}")
+        print(f"   Saved to: {output_path}\n")
+        return output_path
+    
+    def write_duplicate(self, file_path: Path, digest: str) -> Path | None:
+        """Reuse the Markdown of an earlier file with the same content; None if there is none."""
+        for source, existing in self.journal.outputs_for(digest):
+            # The same bytes convert differently under another extension
+            if Path(source).suffix.lower() != file_path.suffix.lower():
+                continue
+            try:
+                previous = open(existing, encoding='utf-8')
+            except OSError:
+                # Deleted or moved by the user since; try an older copy
+                continue
+            with previous:
+                title = None
+                if previous.readline().startswith("<!--"):
+                    for line in previous:
+                        if line.startswith("-->"):
+                            previous.readline()
+                            break
+                        if line.startswith("Title: "):
+                            title = line[len("Title: "):].rstrip("\n")
+                else:
+                    previous.seek(0)
+                
+                def write(f):
+                    # Same header as a conversion, naming the new source, then the body as is
+                    f.write(f"<!-- \n")
+                    f.write(f"Source: {file_path.name}\n")
+                    f.write(f"Converted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    f.write(f"Duplicate of: {Path(source).name} ({Path(existing).name})\n")
+                    if title:
+                        f.write(f"Title: {title}\n")
+                    f.write(f"-->\n\n")
+                    shutil.copyfileobj(previous, f)
+                
+                output_path = write_atomic(mirrored(OUTPUT_DIR, file_path), file_path.stem, ".md", digest, write)
+            
+            print(f"♻️  Duplicate of {Path(source).name}, not reconverted: {output_path.name}")
+            print(f"   Saved to: {output_path}\n")
+            return output_path
+        return None
+    
+    def move_processed(self, file_path: Path, digest: str):
+        """Move a converted original to PROCESSED_DIR, named the same way as its Markdown."""
+        processed_path = move_atomic(file_path, mirrored(PROCESSED_DIR, file_path), digest)
+        self.journal.done(str(file_path), str(processed_path))
+        print(f"📦 Moved to: {processed_path}\n")
+
+
+def make_converter() -> DocumentConverter:
+    """Builds the converter inside each shard process."""
+    return DocumentConverter()
+
 class MarkItDownHandler(FileSystemEventHandler):
     """Handles file system events and converts documents to Markdown."""
     
     def __init__(self):
-        self.md = MarkItDown()
-        self.processing = set()  # Track files currently being processed
-        
         # Create directories if they don't exist
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
         WATCH_DIR.mkdir(parents=True, exist_ok=True)
+        self.converter = DocumentConverter(convert=WATCH_SHARDS <= 1)
+        self.journal = self.converter.journal
         
-        print(f"📁 Watching: {WATCH_DIR}")
+        # inotify reports close-write, so there files are taken when their writer closes them
+        close_events = Observer.__name__ == "InotifyObserver"
+        if WATCH_SHARDS > 1:
+            self.tracker = ShardedTracker(make_converter, close_events=close_events)
+        else:
+            self.tracker = StabilityTracker(self.converter.convert_document, close_events=close_events)
+        
+        print(f"📁 Watching: {WATCH_DIR}" + (" (recursive)" if WATCH_RECURSIVE else ""))
         print(f"📄 Output: {OUTPUT_DIR}")
         print(f"✅ Processed: {PROCESSED_DIR}")
+        print(f"⚙️  Workers: {self.tracker.workers}" + (f" in {WATCH_SHARDS} shards" if WATCH_SHARDS > 1 else ""))
         print(f"🔄 Ready to convert documents...\n")
     
-    def on_created(self, event):
-        """Handle new file creation events."""
-        if event.is_directory:
-            return
-        
-        file_path = Path(event.src_path)
+    def wants(self, path: str) -> Path | None:
+        """The path as a Path if it is a supported document outside the output directories."""
+        file_path = Path(path)
         
         # Skip if file is in output or processed directory
         if OUTPUT_DIR in file_path.parents or PROCESSED_DIR in file_path.parents:
-            return
+            return None
         
         # Check if file extension is supported
         if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
-            return
-        
-        # Avoid processing the same file twice
-        if file_path in self.processing:
-            return
+            return None
         
-        # Wait a moment for file to be fully written
-        time.sleep(1)
-        
-        self.convert_document(file_path)
+        return file_path
     
-    def convert_document(self, file_path: Path):
-        """Convert a document to Markdown."""
-        self.processing.add(file_path)
-        
-        try:
-            print(f"🔄 Processing: {file_path.name}")
-            
-            # Convert to markdown
-            result = self.md.convert(str(file_path))
-            
-            # Generate output filename
-            output_filename = file_path.stem + ".md"
-            output_path = OUTPUT_DIR / output_filename
-            
-            # Handle duplicate filenames
-            counter = 1
-            while output_path.exists():
-                output_filename = f"{file_path.stem}_{counter}.md"
-                output_path = OUTPUT_DIR / output_filename
-                counter += 1
-            
-            # Write markdown content
-            with open(output_path, 'w', encoding='utf-8') as f:
-                # Add metadata header
-                f.write(f"<!-- \n")
-                f.write(f"Source: {file_path.name}\n")
-                f.write(f"Converted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                if hasattr(result, 'title') and result.title:
-                    f.write(f"Title: {result.title}\n")
-                f.write(f"-->\n\n")
-                
-                # Write content
-                f.write(result.text_content)
-            
-            print(f"✅ Converted: {output_filename}")
-            print(f"   Saved to: {output_path}\n")
-            
-            # Move original file to processed directory
-            processed_path = PROCESSED_DIR / file_path.name
-            
-            # Handle duplicate filenames in processed directory
-            counter = 1
-            while processed_path.exists():
-                processed_path = PROCESSED_DIR / f"{file_path.stem}_{counter}{file_path.suffix}"
-                counter += 1
-            
-            file_path.rename(processed_path)
-            print(f"📦 Moved to: {processed_path}\n")
-            
-        except Exception as e:
-            print(f"❌ Error converting {file_path.name}: {str(e)}\n")
-        
-        finally:
-            self.processing.discard(file_path)
+    # These run on the observer thread: filter and enqueue, nothing else
+    
+    def on_created(self, event):
+        """Handle new file creation events."""
+        if not event.is_directory and (file_path := self.wants(event.src_path)):
+            self.tracker.notify(file_path, "created")
+    
+    def on_modified(self, event):
+        """Handle writes to a file that may still be being copied in."""
+        if not event.is_directory and (file_path := self.wants(event.src_path)):
+            self.tracker.notify(file_path, "modified")
+    
+    def on_closed(self, event):
+        """Handle the writer closing a file (close-write, where the platform reports it)."""
+        if not event.is_directory and (file_path := self.wants(event.src_path)):
+            self.tracker.notify(file_path, "closed")
+    
+    def on_moved(self, event):
+        """Handle files renamed into place, as many tools do after writing a temp file."""
+        if not event.is_directory and (file_path := self.wants(event.dest_path)):
+            self.tracker.notify(file_path, "closed")
+    
+    def catch_up(self):
+        """Resume work left over from before a restart: one scan of WATCH_DIR against the journal."""
+        started = time.monotonic()
+        known = self.journal.entries(("in_flight", "converted", "failed"))
+        settled_before = time.time() - WATCH_SETTLE_SECONDS
+        queued = moved = skipped = 0
+        for entry in self.scan():
+            if not (file_path := self.wants(entry.path)):
+                continue
+            st = entry.stat()
+            row = known.pop(str(file_path), None)
+            if row is not None and self.unchanged(row, file_path, st):
+                if row["state"] == "converted":
+                    # Markdown was written before the restart; only the move is left
+                    self.converter.move_processed(file_path, row["sha256"])
+                    moved += 1
+                    continue
+                if row["state"] == "failed":
+                    skipped += 1
+                    continue
+            # Files untouched for the settle time were written while the service was down
+            self.tracker.notify(file_path, "closed" if st.st_mtime < settled_before else "created")
+            queued += 1
+        # The rest were in flight or converted, but their files have gone since
+        self.journal.forget(list(known))
+        elapsed = (time.monotonic() - started) * 1000
+        print(f"🔁 Catch-up: {queued} queued, {moved} moves finished, "
+              f"{skipped} unchanged failures skipped ({elapsed:.0f} ms)\n")
+    
+    @staticmethod
+    def scan():
+        """Files under WATCH_DIR (just its top level unless recursive), skipping the output folders."""
+        folders = [WATCH_DIR]
+        while folders:
+            with os.scandir(folders.pop()) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield entry
+                    elif WATCH_RECURSIVE and entry.is_dir(follow_symlinks=False) and \
+                            Path(entry.path) not in (OUTPUT_DIR, PROCESSED_DIR):
+                        folders.append(entry.path)
+    
+    @staticmethod
+    def unchanged(row, file_path: Path, st) -> bool:
+        """Whether the file is still the one journalled: same size and mtime, or same size and content."""
+        if st.st_size != row["size"]:
+            return False
+        return st.st_mtime_ns == row["mtime_ns"] or (row["sha256"] is not None and file_digest(str(file_path)) == row["sha256"])
 
 def main():
     """Run the file watcher service."""
@@ -132,10 +280,12 @@ def main():
     # Create event handler and observer
     event_handler = MarkItDownHandler()
     observer = Observer()
-    observer.schedule(event_handler, str(WATCH_DIR), recursive=False)
+    observer.schedule(event_handler, str(WATCH_DIR), recursive=WATCH_RECURSIVE)
     
     # Start watching
+    event_handler.tracker.start()
     observer.start()
+    event_handler.catch_up()
     
     print(f"✨ Service started successfully!")
     print(f"📥 Drop files into: {WATCH_DIR}")
@@ -150,6 +300,8 @@ def main():
         observer.stop()
     
     observer.join()
+    event_handler.tracker.stop()
+    event_handler.converter.close()
     print("✅ Service stopped.")
 
 if __name__ == "__main__":
@@ -7,14 +7,20 @@ Provides both a browser UI and REST API endpoints.
 """
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from markitdown import MarkItDown
+from conversion_cache import convert_cached, cache_stats
+from conversion_executor import get_executor
+from upload_spool import spool_upload, UploadTooLarge
+from output_files import write_atomic
+from admission import get_admission, cost_for, AdmissionRejected
+from conversion_metrics import track_conversion, readiness
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import os
 import shutil
 from pathlib import Path
 from datetime import datetime
-import tempfile
 import uvicorn
 
 # Configuration
@@ -422,30 +428,30 @@ async def convert_file(file: UploadFile = File(...)):
             detail=f"Unsupported file type. Supported: {', '.join(SUPPORTED_EXTENSIONS)}"
         )
     
-    # Save uploaded file temporarily
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
+    # FastAPI has already received the body to parse File(...); admitting first
+    # keeps an overloaded server from spooling and converting it
+    try:
+        permit = await get_admission().acquire(cost_for(file_ext))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    # Stream upload to a temp file in chunks, hashing it as it arrives
+    try:
+        upload = await spool_upload(file, file_ext)
+    except UploadTooLarge as e:
+        permit.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        permit.release()
+        raise
+    
     try:
-        # Write uploaded content to temp file
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.close()
-        
         # Convert to markdown
-        result = md.convert(temp_file.name)
+        with track_conversion("upload", upload.path, upload.size) as record:
+            result = await get_executor().run(convert_cached, md, upload.path, upload.digest)
+            record.markdown = result.text_content
         
-        # Generate output filename
-        output_filename = Path(file.filename).stem + ".md"
-        output_path = OUTPUT_DIR / output_filename
-        
-        # Handle duplicate filenames
-        counter = 1
-        while output_path.exists():
-            output_filename = f"{Path(file.filename).stem}_{counter}.md"
-            output_path = OUTPUT_DIR / output_filename
-            counter += 1
-        
-        # Write markdown content
-        with open(output_path, 'w', encoding='utf-8') as f:
+        def write(f):
             # Add metadata header
             f.write(f"<!-- \n")
             f.write(f"Original: {file.filename}\n")
@@ -457,6 +463,10 @@ async def convert_file(file: UploadFile = File(...)):
             # Write content
             f.write(result.text_content)
         
+        # Written to a temp file, then named after the upload, or the upload plus
+        # its content hash if that name is taken
+        output_filename = write_atomic(OUTPUT_DIR, Path(file.filename).stem, ".md", upload.digest, write).name
+        
         return JSONResponse({
             "success": True,
             "filename": output_filename,
@@ -468,8 +478,8 @@ async def convert_file(file: UploadFile = File(...)):
     
     finally:
         # Clean up temp file
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
+        upload.cleanup()
+        permit.release()
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
@@ -506,13 +516,27 @@ async def get_formats():
         ]
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 while saturated so the router stops sending new work"""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
         "service": "MarkItDown Web Service",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "cache": cache_stats(),
+        "executor": get_executor().stats(),
+        "admission": get_admission().stats()
     }
 
 if __name__ == "__main__":